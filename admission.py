@@ -0,0 +1,239 @@
+# admission.py
+"""
+Cost-aware admission control for the query routes, one controller per gunicorn worker.
+- Every request is weighed by the output budget its prompt asks for (smart < step/teacher
+  < research < summary < explanation).
+- Per-client token buckets cap sustained spend; an empty bucket is a fast 429.
+- A global in-flight budget caps what one worker runs at once; when it is full, requests wait
+  in a priority queue that serves the cheapest first, and are shed with 503 when the queue is
+  full or the wait runs out, so under overload expensive styles are shed before smart ones.
+  Both rejections carry Retry-After.
+- Batch items wait behind every interactive request and have their own queue limit, so a few
+  large mock papers cannot fill the queue and shed interactive traffic.
+"""
+
+import heapq
+import itertools
+import math
+import os
+import threading
+import time
+
+# Expected completion tokens per (type_key, style), from the word limits in prompts.py.
+OUTPUT_TOKENS = {
+    ("solution", "smart"): 200,
+    ("solution", "step"): 350,
+    ("solution", "teacher"): 350,
+    ("solution", "research"): 500,
+    ("summary", None): 600,
+    ("explanation", None): 1200,
+    # One map-step call of a long video summary (CHUNK_SUMMARY asks for under 150 words).
+    ("summary_chunk", None): 200,
+}
+DEFAULT_COST = 350
+# Style used when a query names none; app.parse_query applies the same default.
+DEFAULT_STYLE = "smart"
+
+WORKER_BUDGET = int(os.getenv("ADMISSION_WORKER_BUDGET", 6000))
+QUEUE_LIMIT = int(os.getenv("ADMISSION_QUEUE_LIMIT", 64))
+BATCH_QUEUE_LIMIT = int(os.getenv("ADMISSION_BATCH_QUEUE_LIMIT", 64))
+MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", 5))
+BUCKET_CAPACITY = int(os.getenv("ADMISSION_BUCKET_CAPACITY", 10000))
+BUCKET_REFILL = float(os.getenv("ADMISSION_BUCKET_REFILL", 200))
+# Output tokens/sec one worker is expected to drain; only used to size Retry-After.
+DRAIN_RATE = float(os.getenv("ADMISSION_DRAIN_RATE", 500))
+MAX_CLIENTS = 10000
+
+
+def cost_of(type_key, style=None):
+    """
+    Admission cost of a query, in expected output tokens. A missing style costs as the
+    default style; an unknown (or non-string) one costs DEFAULT_COST.
+    """
+    if type_key in ("explanation", "summary", "summary_chunk"):
+        return OUTPUT_TOKENS[(type_key, None)]
+    style = style or DEFAULT_STYLE
+    if not isinstance(style, str):
+        return DEFAULT_COST
+    return OUTPUT_TOKENS.get((type_key, style.lower()), DEFAULT_COST)
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted; maps to an HTTP status with Retry-After."""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity):
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now, capacity, rate):
+        # `now` may predate a bucket created under the lock; never refill negatively.
+        if now > self.updated:
+            self.tokens = min(capacity, self.tokens + (now - self.updated) * rate)
+            self.updated = now
+
+
+class Ticket:
+    """An admitted request's share of the worker budget; release() is idempotent."""
+
+    __slots__ = ("controller", "cost", "_released")
+
+    def __init__(self, controller, cost):
+        self.controller = controller
+        self.cost = cost
+        self._released = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.controller._release(self.cost)
+
+
+class AdmissionController:
+    def __init__(self, budget=WORKER_BUDGET, queue_limit=QUEUE_LIMIT, max_wait=MAX_WAIT,
+                 bucket_capacity=BUCKET_CAPACITY, bucket_refill=BUCKET_REFILL, batch_queue_limit=BATCH_QUEUE_LIMIT):
+        self.budget = budget
+        self.queue_limit = queue_limit
+        self.batch_queue_limit = batch_queue_limit
+        self.max_wait = max_wait
+        self.bucket_capacity = bucket_capacity
+        self.bucket_refill = bucket_refill
+        self.in_flight = 0
+        self.in_flight_cost = 0
+        self.admitted = 0
+        self.rejected_client = 0
+        self.rejected_busy = 0
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._waiters = []
+        self._seq = itertools.count()
+
+    def charge(self, client, cost, allow_debt=False):
+        """
+        Take `cost` from the client's bucket or raise Rejected(429). With allow_debt the bucket
+        may go negative (used for batches larger than the bucket), as long as it is not already empty.
+        """
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.pop(client, None) or TokenBucket(self.bucket_capacity)
+            # Re-insert to keep the dict in recency order so idle clients are dropped first.
+            self._buckets[client] = bucket
+            if len(self._buckets) > MAX_CLIENTS:
+                del self._buckets[next(iter(self._buckets))]
+            bucket.refill(now, self.bucket_capacity, self.bucket_refill)
+            if bucket.tokens >= cost or (allow_debt and bucket.tokens > 0):
+                bucket.tokens -= cost
+                return
+            self.rejected_client += 1
+            deficit = (cost if not allow_debt else 1) - bucket.tokens
+        raise Rejected(429, "rate limit exceeded", deficit / self.bucket_refill)
+
+    def acquire(self, cost, timeout=None, batch=False):
+        """
+        Reserve `cost` from the worker budget, waiting in the cheapest-first queue if needed.
+        Batch items queue behind all interactive requests, under their own queue limit.
+        Returns a Ticket or raises Rejected(503).
+        """
+        cost = min(cost, self.budget)
+        timeout = self.max_wait if timeout is None else timeout
+        priority = 1 if batch else 0
+        with self._lock:
+            if not self._waiters and self.in_flight_cost + cost <= self.budget:
+                return self._grant(cost)
+            if self._queued(priority) >= (self.batch_queue_limit if batch else self.queue_limit):
+                self.rejected_busy += 1
+                raise Rejected(503, "server busy", self._retry_after())
+            # [priority, cost, seq, event, granted]; heap order serves interactive before batch,
+            # then the cheapest, then the oldest.
+            waiter = [priority, cost, next(self._seq), threading.Event(), False]
+            heapq.heappush(self._waiters, waiter)
+            self._wake_locked()
+        if waiter[3].wait(timeout):
+            return Ticket(self, cost)
+        with self._lock:
+            if waiter[4]:
+                # Granted between the timeout and taking the lock.
+                return Ticket(self, cost)
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self.rejected_busy += 1
+            retry_after = self._retry_after()
+            self._wake_locked()
+        raise Rejected(503, "server busy", retry_after)
+
+    def refund(self, client, cost):
+        with self._lock:
+            bucket = self._buckets.get(client)
+            if bucket is not None:
+                bucket.tokens = min(self.bucket_capacity, bucket.tokens + cost)
+
+    def admit(self, client, cost, timeout=None, allow_debt=False):
+        """Charge the client and reserve worker budget; a request shed with 503 is not billed."""
+        self.charge(client, cost, allow_debt)
+        try:
+            return self.acquire(cost, timeout)
+        except Rejected:
+            self.refund(client, cost)
+            raise
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "in_flight_cost": self.in_flight_cost,
+            "budget": self.budget,
+            "queued": self._queued(0),
+            "queued_batch": self._queued(1),
+            "admitted": self.admitted,
+            "rejected_client": self.rejected_client,
+            "rejected_busy": self.rejected_busy,
+        }
+
+    def _grant(self, cost):
+        self.in_flight += 1
+        self.in_flight_cost += cost
+        self.admitted += 1
+        return Ticket(self, cost)
+
+    def _release(self, cost):
+        with self._lock:
+            self.in_flight -= 1
+            self.in_flight_cost -= cost
+            self._wake_locked()
+
+    def _queued(self, priority):
+        return sum(1 for w in self._waiters if w[0] == priority)
+
+    def _wake_locked(self):
+        # The head is the cheapest waiter of the highest priority; if it does not fit, nobody
+        # else is served either, so batch items never overtake a waiting interactive request.
+        while self._waiters and self.in_flight_cost + self._waiters[0][1] <= self.budget:
+            waiter = heapq.heappop(self._waiters)
+            self._grant(waiter[1])
+            waiter[4] = True
+            waiter[3].set()
+
+    def _retry_after(self):
+        backlog = self.in_flight_cost + sum(w[1] for w in self._waiters)
+        return backlog / DRAIN_RATE
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_controller():
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController()
+    return _controller
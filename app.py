@@ -1,14 +1,365 @@
-from flask import Flask, jsonify
+from flask import Flask, Response, g, jsonify, request, stream_with_context
 from flask_cors import CORS
+import json
 import os
 
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import admission
+import batch
+import history
+import identity
+import llm
+import metrics
+import transcripts
+from cache import get_cache, make_key
+from prompts import EXAM_CATEGORIES, PROMPTS, get_prompt
+
 app = Flask(__name__)
+# Railway's proxy appends the caller's address to X-Forwarded-For; trust only the hops our own
+# proxies add, so request.remote_addr cannot be spoofed with a client-supplied header.
+TRUSTED_PROXIES = int(os.getenv("TRUSTED_PROXIES", 1))
+if TRUSTED_PROXIES:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXIES)
 CORS(app, origins=["https://vikal-new-production.up.railway.app"], methods=["GET", "POST", "OPTIONS"])
 
+# Frontend mode -> prompt type_key
+MODES = {"solve": "solution", "learn": "explanation", "summarize": "summary"}
+# Batch items queue for worker budget longer than interactive requests before failing.
+BATCH_ITEM_WAIT = float(os.getenv("BATCH_ITEM_WAIT", 30))
+
+
+def parse_query(mode, data):
+    """
+    Validate a JSON query for a mode; returns (args, video_id, error_message).
+    Summaries take either a raw `transcript` or a YouTube `video` (ID or URL).
+    """
+    if not isinstance(data, dict):
+        return None, None, "request body must be a JSON object"
+    for field in ("category", "style", "topic", "transcript", "video"):
+        if data.get(field) is not None and not isinstance(data[field], str):
+            return None, None, f"{field} must be a string"
+    topic = (data.get("topic") or "").strip()
+    video_id = None
+    transcript = data.get("transcript")
+    if mode == "summarize" and not transcript:
+        if not data.get("video"):
+            return None, None, "transcript or video is required"
+        try:
+            video_id = transcripts.video_id_from(data["video"])
+        except transcripts.TranscriptError as e:
+            return None, None, str(e)
+        # Stands in for the transcript in the cache key; the text itself is fetched lazily.
+        transcript = f"youtube:{video_id}"
+        topic = topic or video_id
+    if not topic:
+        return None, None, "topic is required"
+    args = {
+        "category": (data.get("category") or "generic").lower(),
+        "type_key": MODES[mode],
+        "style": data.get("style") or admission.DEFAULT_STYLE,
+        "topic": topic,
+        "transcript": transcript,
+    }
+    return args, video_id, None
+
+
+def prompt_labels(args):
+    """Bounded (category, type, style) labels for prompt-size metrics; user input never becomes a label as-is."""
+    category = args["category"] if args["category"] in EXAM_CATEGORIES else "generic"
+    if args["type_key"] != "solution":
+        return category, args["type_key"], "-"
+    style = args["style"].lower()
+    return category, "solution", style if style in PROMPTS["generic"]["solution"] else "other"
+
+
+def prompt_builder(args, video_id):
+    """Return a callable that builds the prompt; long-video summaries run the map step when called."""
+    def build():
+        if video_id is None:
+            prompt = get_prompt(**args)
+        else:
+            prompt = transcripts.summary_prompt(transcripts.fetch_transcript(video_id), args["topic"], args["style"])
+        metrics.PROMPT_SIZE.observe(len(prompt), *prompt_labels(args))
+        return prompt
+    return build
+
+
+def answer(args, build_prompt):
+    """Blocking answer for a parsed query, served from the response cache when possible."""
+    return get_cache().get_or_compute(make_key(**args), lambda: llm.complete(build_prompt()))
+
+
+def batch_cost(item):
+    """Admission cost of one batch item; items that fail validation are billed at DEFAULT_COST."""
+    args, _, error = parse_query("solve", item if isinstance(item, dict) else {})
+    if error:
+        return admission.DEFAULT_COST
+    return admission.cost_of(args["type_key"], args["style"])
+
+
+def remember(user, args, result, cached=False):
+    history.record(user, args["category"], args["type_key"], args["style"], args["topic"], result, cached)
+
+
+def query_cost(args, video_id):
+    """Admission cost of a query; a long video summary also pays for each chunk its map step summarizes."""
+    cost = admission.cost_of(args["type_key"], args["style"])
+    if video_id is not None:
+        chunks = transcripts.map_calls(transcripts.fetch_transcript(video_id))
+        cost += chunks * admission.cost_of("summary_chunk")
+    return cost
+
+
+def solve_item(item, user):
+    """Solve one batch item under the worker budget; raises ValueError for an invalid item."""
+    args, video_id, error = parse_query("solve", item if isinstance(item, dict) else {})
+    if error:
+        raise ValueError(error)
+    ticket = admission.get_controller().acquire(admission.cost_of(args["type_key"], args["style"]), BATCH_ITEM_WAIT, batch=True)
+    try:
+        result = answer(args, prompt_builder(args, video_id))
+    finally:
+        ticket.release()
+    remember(user, args, result)
+    return result
+
+
+def client_id():
+    """Client identity for rate limiting: the address our proxy saw (see TRUSTED_PROXIES)."""
+    return request.remote_addr or "unknown"
+
+
+def user_id():
+    """History owner: the user id of a valid X-User-Token issued by /api/identity, else None."""
+    return identity.verify(request.headers.get(identity.HEADER))
+
+
+def rejection(e):
+    response = jsonify({"error": e.reason})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+
+def wants_stream():
+    if request.args.get("stream", "").lower() in ("1", "true", "yes"):
+        return True
+    return "text/event-stream" in request.headers.get("Accept", "")
+
+
+def sse(data, event=None):
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+def stream_answer(build_prompt, key, on_done):
+    """
+    Relay upstream tokens as SSE. WSGI pulls this generator one chunk at a time, so a slow
+    client throttles the upstream read; on disconnect the server closes the generator,
+    which closes llm.stream() and drops the upstream connection.
+    `on_done(answer, cached)` is called once a complete answer has been sent.
+    """
+    cache = get_cache()
+    cached = cache.get(key)
+    if cached is not None:
+        on_done(cached, True)
+        yield sse({"token": cached, "cached": True})
+        yield sse({}, event="done")
+        return
+    yield ": stream open\n\n"
+    try:
+        tokens = llm.stream(build_prompt())
+    except (llm.LLMError, transcripts.TranscriptError) as e:
+        yield sse({"error": str(e)}, event="error")
+        return
+    parts = []
+    try:
+        for token in tokens:
+            parts.append(token)
+            yield sse({"token": token})
+    except llm.LLMError as e:
+        yield sse({"error": str(e)}, event="error")
+        return
+    finally:
+        tokens.close()
+    result = "".join(parts)
+    cache.set(key, result)
+    on_done(result, False)
+    yield sse({}, event="done")
+
+
+def ndjson(results):
+    try:
+        for result in results:
+            yield json.dumps(result) + "\n"
+    finally:
+        results.close()
+
+
+@app.before_request
+def start_timer():
+    g.metrics_start = metrics.request_started()
+
+
+@app.after_request
+def record_request(response):
+    start = g.pop("metrics_start", None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        # Observed on close so streamed responses are timed until the last byte.
+        response.call_on_close(lambda: metrics.request_finished(start, route, response.status_code))
+    return response
+
+
+def register_gauges():
+    metrics.register_gauge(
+        "vikal_cache_events_total", "Response cache events by kind.", ("event",),
+        lambda: {(k,): v for k, v in get_cache().stats().items() if k != "size_l1"}, type="counter",
+    )
+    metrics.register_gauge("vikal_cache_entries", "Entries in this worker's L1 response cache.", (), lambda: {(): len(get_cache().l1)})
+    metrics.register_gauge(
+        "vikal_admission", "Admission controller state (in-flight, budget, queue) and totals.", ("field",),
+        lambda: {(k,): v for k, v in admission.get_controller().stats().items()},
+    )
+    metrics.register_gauge(
+        "vikal_history", "Write-behind history buffer (pending) and totals (written, dropped, errors).", ("field",),
+        lambda: {(k,): v for k, v in history.stats().items()},
+    )
+    metrics.register_gauge("vikal_upstream_in_flight", "Distinct upstream completions in flight (after coalescing).", (), lambda: {(): llm.flight_stats()["in_flight"]})
+    metrics.register_gauge(
+        "vikal_upstream_coalesced_total", "Completions served by joining an identical in-flight call.", (),
+        lambda: {(): llm.flight_stats()["coalesced"]}, type="counter",
+    )
+
+
+register_gauges()
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+
 @app.route('/')
 def home():
     return jsonify({"message": "API is running", "status": "ok"}), 200
 
+
+@app.route('/api/<mode>', methods=['POST'])
+def query(mode):
+    if mode not in MODES:
+        return jsonify({"error": f"unknown mode '{mode}'"}), 404
+    args, video_id, error = parse_query(mode, request.get_json(silent=True) or {})
+    if error:
+        return jsonify({"error": error}), 400
+    build_prompt = prompt_builder(args, video_id)
+    key = make_key(**args)
+    user = user_id()
+    if not wants_stream():
+        # Cache hits cost nothing upstream, so they skip admission entirely.
+        cached = get_cache().get(key)
+        if cached is not None:
+            remember(user, args, cached, cached=True)
+            return jsonify({"answer": cached}), 200
+    try:
+        cost = query_cost(args, video_id)
+    except transcripts.TranscriptError as e:
+        return jsonify({"error": str(e)}), 422
+    try:
+        # A long video can cost more than a full bucket; like batches, it may put the bucket in debt.
+        ticket = admission.get_controller().admit(client_id(), cost, allow_debt=video_id is not None)
+    except admission.Rejected as e:
+        return rejection(e)
+
+    if wants_stream():
+        headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        events = stream_answer(build_prompt, key, lambda result, cached: remember(user, args, result, cached))
+        response = Response(stream_with_context(events), mimetype="text/event-stream", headers=headers)
+        # Hold the budget until the stream is finished or the client disconnects.
+        response.call_on_close(ticket.release)
+        return response
+
+    try:
+        # The lookup above already missed; go straight upstream instead of checking L1/L2 again.
+        result = get_cache().compute(key, lambda: llm.complete(build_prompt()))
+    except transcripts.TranscriptError as e:
+        return jsonify({"error": str(e)}), 422
+    except llm.LLMError as e:
+        return jsonify({"error": str(e)}), 502
+    finally:
+        ticket.release()
+    remember(user, args, result)
+    return jsonify({"answer": result}), 200
+
+
+@app.route('/api/solve/batch', methods=['POST'])
+def solve_batch():
+    """
+    Solve a list of {category, style, topic} items with bounded concurrency. Results stream
+    back as NDJSON lines in completion order: {"index", "ok", "answer"} or {"index", "ok", "error"}.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "request body must be a JSON object"}), 400
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "items must be a non-empty list"}), 400
+    if len(items) > batch.BATCH_MAX_ITEMS:
+        return jsonify({"error": f"at most {batch.BATCH_MAX_ITEMS} items per batch"}), 400
+    concurrency = batch.clamp_concurrency(data.get("concurrency"))
+    # Bill the whole paper up front (the bucket may go into debt); each item then competes
+    # for worker budget like any other request.
+    costs = sum(batch_cost(item) for item in items)
+    try:
+        admission.get_controller().charge(client_id(), costs, allow_debt=True)
+    except admission.Rejected as e:
+        return rejection(e)
+    user = user_id()
+    results = batch.run_batch(items, lambda item: solve_item(item, user), concurrency)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return Response(stream_with_context(ndjson(results)), mimetype="application/x-ndjson", headers=headers)
+
+
+@app.route('/api/identity', methods=['POST'])
+def issue_identity():
+    """Issue a signed user token; the frontend stores it and sends it as X-User-Token."""
+    if not identity.enabled():
+        return jsonify({"error": "user tokens are not enabled"}), 503
+    return jsonify({"token": identity.issue()}), 201
+
+
+@app.route('/api/history', methods=['GET'])
+def query_history():
+    """
+    The caller's history, newest first: ?limit=20&cursor=<next_cursor from the previous page>.
+    Keyset pagination, so every page is one indexed range scan regardless of depth.
+    """
+    if not os.getenv("MONGO_URI") or not identity.enabled():
+        return jsonify({"error": "history is not enabled"}), 503
+    user = user_id()
+    if user is None:
+        return jsonify({"error": f"a valid {identity.HEADER} is required"}), 401
+    try:
+        limit = int(request.args.get("limit", 20))
+        docs, next_cursor = history.page(history.get_collection(), user, limit, request.args.get("cursor"))
+    except (ValueError, history.CursorError) as e:
+        return jsonify({"error": str(e)}), 400
+    items = [
+        {
+            "id": str(doc["_id"]),
+            "created_at": doc["created_at"].isoformat(),
+            "category": doc["category"],
+            "type": doc["type"],
+            "style": doc["style"],
+            "topic": doc["topic"],
+            "answer": doc["answer"],
+        }
+        for doc in docs
+    ]
+    return jsonify({"items": items, "next_cursor": next_cursor}), 200
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 5001))
     app.run(host="0.0.0.0", port=port, debug=False)
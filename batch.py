@@ -0,0 +1,52 @@
+# batch.py
+"""
+Bounded fan-out for batch solves (full GATE/RRB mock papers).
+Items run on a thread pool with at most `concurrency` in flight; results are yielded in
+completion order, tagged with the item's index, and a failing item yields an error result
+instead of aborting the batch.
+"""
+
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 150))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 32))
+
+
+def clamp_concurrency(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return BATCH_CONCURRENCY
+    return max(1, min(value, BATCH_MAX_CONCURRENCY))
+
+
+def run_batch(items, solve, concurrency=BATCH_CONCURRENCY):
+    """
+    Yield {"index", "ok", "answer"|"error"} dicts as items finish. `solve(item)` returns the
+    answer or raises. Closing the generator (client went away) cancels items not yet started.
+    """
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch")
+    pending = {}
+    queue = iter(enumerate(items))
+    try:
+        for index, item in queue:
+            pending[pool.submit(solve, item)] = index
+            if len(pending) >= concurrency:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                # Refill the slot before yielding so the pool stays busy while the client reads.
+                for next_index, item in queue:
+                    pending[pool.submit(solve, item)] = next_index
+                    break
+                try:
+                    result = {"index": index, "ok": True, "answer": future.result()}
+                except Exception as e:
+                    result = {"index": index, "ok": False, "error": str(e) or type(e).__name__}
+                yield result
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,94 @@
+# benchmarks/bench_admission.py
+"""
+p50/p99 latency per style under a mixed open-loop load, with and without admission control.
+Each simulated request holds one of `slots` worker threads for a time proportional to its
+expected output, as an upstream completion would. "fifo" is today's first-come thread pool;
+"admission" puts AdmissionController (budget sized to the same capacity, default queue limit
+and max wait) in front of it. Run above capacity to see smart p99 hold while fifo degrades.
+
+    python benchmarks/bench_admission.py [--seconds 10] [--rps 50] [--slots 16]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import admission  # noqa: E402
+
+MIX = [("solution", "smart")] * 4 + [("solution", "step"), ("solution", "teacher"), ("solution", "research")] * 2 + [
+    ("explanation", None),
+    ("summary", None),
+]
+MS_PER_TOKEN = 1.0
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else None
+
+
+def run(mode, seconds, rps, slots):
+    mean_cost = statistics.mean(admission.cost_of(*m) for m in MIX)
+    controller = admission.AdmissionController(budget=int(slots * mean_cost), bucket_capacity=10**9)
+    threads_pool = threading.Semaphore(slots)
+    latencies = {}
+    shed = []
+    lock = threading.Lock()
+
+    def request(type_key, style):
+        cost = admission.cost_of(type_key, style)
+        start = time.perf_counter()
+        ticket = None
+        if mode == "admission":
+            try:
+                ticket = controller.admit("bench", cost)
+            except admission.Rejected:
+                shed.append(style or type_key)
+                return
+        try:
+            with threads_pool:
+                time.sleep(cost * MS_PER_TOKEN / 1000)
+        finally:
+            if ticket is not None:
+                ticket.release()
+        with lock:
+            latencies.setdefault(style or type_key, []).append(time.perf_counter() - start)
+
+    rng = random.Random(42)
+    threads = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        t = threading.Thread(target=request, args=rng.choice(MIX))
+        t.start()
+        threads.append(t)
+        time.sleep(rng.expovariate(rps))
+    for t in threads:
+        t.join()
+    return {
+        name: {
+            "n": len(v),
+            "p50_ms": round(statistics.median(v) * 1000),
+            "p99_ms": round(percentile(v, 0.99) * 1000),
+        }
+        for name, v in sorted(latencies.items())
+    } | {"shed": len(shed)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--rps", type=float, default=50)
+    parser.add_argument("--slots", type=int, default=16, help="concurrent upstream calls per worker")
+    args = parser.parse_args()
+    print(json.dumps({mode: run(mode, args.seconds, args.rps, args.slots) for mode in ("fifo", "admission")}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_batch.py
+"""
+Wall time for a 100-question mock paper through /api/solve/batch at several concurrency
+levels, against the stub LLM. One deliberately invalid item checks failure isolation.
+
+    python benchmarks/bench_batch.py [--questions 100] [--levels 1,4,8,16,32] [--latency 0.2]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stub_llm  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=100)
+    parser.add_argument("--levels", default="1,4,8,16,32")
+    parser.add_argument("--latency", type=float, default=0.2, help="stub seconds per completion")
+    args = parser.parse_args()
+
+    stub = stub_llm.start(latency=args.latency, tokens=100, rate=0)
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.setdefault("LLM_POOL_SIZE", "32")
+    os.environ.pop("MONGO_URI", None)
+
+    import requests
+    from werkzeug.serving import make_server
+
+    import app as vikal
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, vikal.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/solve/batch"
+
+    rows = []
+    for level in (int(x) for x in args.levels.split(",")):
+        categories = ("gate", "rrb", "generic", "upsc")
+        styles = ("smart", "step", "teacher", "research")
+        # Unique topics per run so the response cache never short-circuits the upstream call.
+        items = [
+            {"category": categories[i % 4], "style": styles[i % 4], "topic": f"Q{i} run {level} {time.time()}"}
+            for i in range(args.questions - 1)
+        ]
+        items.insert(args.questions // 2, {"category": "gate", "style": "smart"})
+        start = time.perf_counter()
+        first = None
+        ok = failed = 0
+        with requests.post(url, json={"items": items, "concurrency": level}, stream=True) as resp:
+            for line in resp.iter_lines():
+                if not line:
+                    continue
+                first = first or time.perf_counter() - start
+                result = json.loads(line)
+                ok += result["ok"]
+                failed += not result["ok"]
+        rows.append({
+            "concurrency": level,
+            "wall_s": round(time.perf_counter() - start, 2),
+            "first_result_s": round(first, 3),
+            "ok": ok,
+            "failed": failed,
+        })
+
+    server.shutdown()
+    stub.shutdown()
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_history.py
+"""
+History write throughput and page latency against a local mongod.
+- sync:         one insert_one per record, as a per-request write would do
+- write-behind: HistoryWriter buffering and flushing with unordered insert_many
+- paging:       keyset cursor vs skip/limit for a page deep into one user's history
+
+    MONGO_URI=mongodb://127.0.0.1:27017 python benchmarks/bench_history.py [records]
+
+Uses (and drops) the `vikal_bench` database.
+"""
+
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import history  # noqa: E402
+
+
+def make_record(i):
+    return {
+        "user": f"user{i % 50}",
+        "category": ("gate", "rrb", "upsc", "generic")[i % 4],
+        "type": "solution",
+        "style": ("smart", "step", "teacher", "research")[i % 4],
+        "topic": f"question {i}",
+        "answer": "### Solution\n" + "x" * 600,
+        "cached": False,
+    }
+
+
+def main():
+    from pymongo import DESCENDING, MongoClient
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    uri = os.getenv("MONGO_URI", "mongodb://127.0.0.1:27017")
+    client = MongoClient(uri, tz_aware=True)
+    client.drop_database("vikal_bench")
+    db = client["vikal_bench"]
+    report = {"records": n}
+
+    sync = db["history_sync"]
+    history.ensure_indexes(sync)
+    start = time.perf_counter()
+    for i in range(n):
+        sync.insert_one(dict(make_record(i), created_at=datetime.now(timezone.utc)))
+    report["sync_records_per_s"] = round(n / (time.perf_counter() - start))
+
+    behind = db["history_write_behind"]
+    writer = history.HistoryWriter(lambda: behind)
+    start = time.perf_counter()
+    for i in range(n):
+        writer.record(make_record(i))
+    enqueue = time.perf_counter() - start
+    writer.flush()
+    report["write_behind_enqueue_us_per_record"] = round(enqueue / n * 1e6, 2)
+    report["write_behind_records_per_s"] = round(n / (time.perf_counter() - start))
+    report["write_behind_stats"] = writer.stats()
+
+    # Page ~80% deep into one user's history: keyset walks cursors, skip/limit jumps straight there.
+    user, size = "user7", 20
+    depth = behind.count_documents({"user": user}) * 8 // 10 // size
+    cursor = None
+    for _ in range(depth):
+        _, cursor = history.page(behind, user, size, cursor)
+    start = time.perf_counter()
+    for _ in range(50):
+        history.page(behind, user, size, cursor)
+    report["keyset_page_ms"] = round((time.perf_counter() - start) / 50 * 1000, 3)
+    start = time.perf_counter()
+    for _ in range(50):
+        list(behind.find({"user": user}).sort([("created_at", DESCENDING), ("_id", DESCENDING)]).skip(depth * size).limit(size))
+    report["skip_limit_page_ms"] = round((time.perf_counter() - start) / 50 * 1000, 3)
+    report["page_depth"] = depth
+
+    client.drop_database("vikal_bench")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_llm_client.py
+"""
+Upstream hit and connection counts for llm.complete() under concurrent load, against the stub LLM.
+- duplicates: N threads send the same prompt at once; single-flight should make exactly one call.
+- distinct:   N threads send different prompts; the pooled Session should reuse keep-alive
+              connections, capped at LLM_POOL_SIZE.
+- flaky:      distinct prompts against a stub failing 30% of calls; retries should hide the errors.
+
+    python benchmarks/bench_llm_client.py [threads]
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stub_llm  # noqa: E402
+
+
+def run(prompts, threads):
+    import llm
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda p: _safe(llm.complete, p), prompts))
+    return round(time.perf_counter() - start, 2), sum(1 for r in results if isinstance(r, Exception))
+
+
+def _safe(fn, arg):
+    try:
+        return fn(arg)
+    except Exception as e:
+        return e
+
+
+def main():
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    stub = stub_llm.start(latency=0.2, tokens=50, rate=0)
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.setdefault("LLM_BACKOFF_BASE", "0.05")
+    import llm
+
+    report = {"threads": threads, "pool_size": llm.POOL_SIZE}
+
+    seconds, failed = run(["Solve the trending GATE question"] * threads, threads)
+    report["duplicates"] = {"upstream_calls": stub.hits, "seconds": seconds, "failed": failed}
+
+    hits, conns = stub.hits, stub.connections
+    seconds, failed = run([f"question {i}" for i in range(threads * 2)], threads)
+    report["distinct"] = {
+        "requests": threads * 2,
+        "upstream_calls": stub.hits - hits,
+        "new_connections": stub.connections - conns,
+        "seconds": seconds,
+        "failed": failed,
+    }
+
+    stub.error_rate = 0.3
+    hits, errors = stub.hits, stub.errors
+    seconds, failed = run([f"flaky question {i}" for i in range(threads)], threads)
+    report["flaky"] = {
+        "requests": threads,
+        "upstream_calls": stub.hits - hits,
+        "upstream_503s": stub.errors - errors,
+        "failed": failed,
+        "seconds": seconds,
+    }
+
+    stub.shutdown()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
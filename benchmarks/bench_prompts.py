@@ -0,0 +1,58 @@
+# benchmarks/bench_prompts.py
+"""
+Micro-benchmark: prompt renders/sec via the original str.format lookup vs the
+precompiled REGISTRY/FALLBACK templates used by get_prompt, across generic and exam categories.
+
+    python benchmarks/bench_prompts.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from prompts import PROMPTS, get_prompt  # noqa: E402
+
+CASES = [
+    ("generic", "explanation", "smart", "Kirchhoff's laws", None),
+    ("generic", "summary", "smart", "Lecture 4: Transformers", "transcript text " * 200),
+    ("generic", "solution", "smart", "Find the RMS value of 10 sin(wt)", None),
+    ("generic", "solution", "Research", "Derive the transfer function of an RLC circuit", None),
+    ("gate", "solution", "step", "Find the Thevenin equivalent across terminals a-b", None),
+    ("upsc", "solution", "teacher", "Explain the significance of the 73rd Amendment", None),
+    ("rrb", "solution", "smart", "A train 120 m long passes a pole in 6 s; find its speed", None),
+]
+
+
+def legacy_get_prompt(category, type_key, style, topic, transcript=None):
+    if type_key == "explanation":
+        return PROMPTS["generic"]["explanation"].format(topic=topic)
+    elif type_key == "summary" and transcript:
+        return PROMPTS["generic"]["summary"].format(topic=topic, transcript=transcript)
+    section = "exams" if category in ["upsc", "gate", "rrb"] else "generic"
+    return PROMPTS.get(section, {}).get(type_key, {}).get(style.lower(), f"Solve {topic} with style {style}.").format(topic=topic)
+
+
+def bench(fn, iterations, cases):
+    def loop():
+        for case in cases:
+            fn(*case)
+    seconds = min(timeit.repeat(loop, number=iterations, repeat=5))
+    return iterations * len(cases) / seconds
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for case in CASES:
+        assert legacy_get_prompt(*case) == get_prompt(*case)
+    groups = {"generic": [c for c in CASES if c[0] == "generic"], "exams": [c for c in CASES if c[0] != "generic"], "all": CASES}
+    for name, cases in groups.items():
+        before = bench(legacy_get_prompt, iterations, cases)
+        after = bench(get_prompt, iterations, cases)
+        print(f"{name:8} str.format lookup : {before:,.0f} renders/sec")
+        print(f"{name:8} compiled templates: {after:,.0f} renders/sec ({after / before:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_summarize.py
+"""
+Single-prompt vs map-reduce summarization of synthetic 10k-100k word transcripts.
+The stub model's latency grows with prompt size (prefill) like a real one; peak memory is
+what the summarization step allocates on top of the already-fetched transcript.
+
+    python benchmarks/bench_summarize.py [--workers 4] [--prefill-ms 0.05]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import transcripts  # noqa: E402
+from prompts import get_prompt  # noqa: E402
+
+
+def synthetic_transcript(words, words_per_segment=12):
+    segments = []
+    for i in range(0, words, words_per_segment):
+        text = " ".join(f"word{(i + j) % 997}" for j in range(words_per_segment))
+        segments.append((i * 0.4, (i + words_per_segment) * 0.4, text))
+    return segments
+
+
+def stub_model(prefill_ms, base_ms=200):
+    note = "📌 key point " * 50
+
+    def complete(prompt):
+        time.sleep((base_ms + transcripts.estimate_tokens(prompt) * prefill_ms) / 1000)
+        return note
+    return complete
+
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return round(elapsed, 2), round(peak / 1024)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=transcripts.MAP_WORKERS)
+    parser.add_argument("--prefill-ms", type=float, default=0.05, help="stub latency per prompt token")
+    args = parser.parse_args()
+    complete = stub_model(args.prefill_ms)
+
+    rows = []
+    for words in (10_000, 25_000, 50_000, 100_000):
+        segments = synthetic_transcript(words)
+
+        def single():
+            transcript = " ".join(text for _, _, text in segments)
+            complete(get_prompt("generic", "summary", "smart", "Lecture", transcript=transcript))
+
+        def pipeline():
+            complete(transcripts.summary_prompt(segments, "Lecture", complete=complete, workers=args.workers))
+
+        single_s, single_kb = measure(single)
+        pipeline_s, pipeline_kb = measure(pipeline)
+        rows.append({
+            "words": words,
+            "single_prompt_tokens": transcripts.estimate_tokens(" ".join(t for _, _, t in segments)),
+            "single_s": single_s,
+            "single_peak_kb": single_kb,
+            "pipeline_s": pipeline_s,
+            "pipeline_peak_kb": pipeline_kb,
+        })
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
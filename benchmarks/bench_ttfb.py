@@ -0,0 +1,67 @@
+# benchmarks/bench_ttfb.py
+"""
+Time-to-first-token for /api/solve in SSE mode vs time-to-response in JSON mode,
+against a local stub LLM (no network, no API key needed).
+
+    python benchmarks/bench_ttfb.py [requests]
+"""
+
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import stub_llm  # noqa: E402
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    stub = stub_llm.start(latency=0.3, tokens=250, rate=100)
+    os.environ["OPENAI_BASE_URL"] = stub.base_url
+    os.environ.pop("MONGO_URI", None)
+
+    import logging
+
+    import requests
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    import app as vikal
+
+    server = make_server("127.0.0.1", 0, vikal.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/api/solve"
+
+    first_token, stream_total, json_total = [], [], []
+    for i in range(n):
+        # Unique topics so the response cache never short-circuits the upstream call.
+        body = {"category": "generic", "style": "research", "topic": f"stream question {i} {time.time()}"}
+        start = time.perf_counter()
+        with requests.post(url, params={"stream": 1}, json=body, stream=True) as resp:
+            for line in resp.iter_lines(decode_unicode=True):
+                if line.startswith("data:") and "token" in line and len(first_token) == i:
+                    first_token.append(time.perf_counter() - start)
+        stream_total.append(time.perf_counter() - start)
+
+        body["topic"] = f"json question {i} {time.time()}"
+        start = time.perf_counter()
+        requests.post(url, json=body).raise_for_status()
+        json_total.append(time.perf_counter() - start)
+
+    server.shutdown()
+    stub.shutdown()
+    print(json.dumps({
+        "requests": n,
+        "sse_first_token_ms": round(statistics.median(first_token) * 1000, 1),
+        "sse_complete_ms": round(statistics.median(stream_total) * 1000, 1),
+        "json_complete_ms": round(statistics.median(json_total) * 1000, 1),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+# benchmarks/loadtest.py
+"""
+End-to-end load test: the Flask app under gunicorn against the stub LLM, driven by a realistic
+mix of Learn (explanation), Summarize and Solve (smart/step/teacher/research) requests across
+the generic, upsc, gate and rrb categories. Prints one JSON report (throughput, p50/p95/p99
+overall and per request kind, status counts, peak worker RSS) so runs can be diffed.
+
+    python benchmarks/loadtest.py --workers 2 --threads 8 --concurrency 32 --duration 30
+    python benchmarks/loadtest.py --stub-latency 0.5 --stub-rate 80 --stream 0.3 --output bench_output.txt
+
+Everything runs locally: no API key, no network. MongoDB is only used if --mongo-uri is given.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CATEGORIES = ("generic", "upsc", "gate", "rrb")
+STYLES = ("smart", "step", "teacher", "research")
+# Relative weights of request kinds; Solve dominates real traffic.
+DEFAULT_MIX = {"solve": 0.7, "learn": 0.2, "summarize": 0.1}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url, timeout=20):
+    import requests
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def worker_pids(master_pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Field 4 is the parent pid; the command name (field 2) may contain spaces.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == master_pid:
+            children.append(int(entry))
+    return children
+
+
+def rss_kb(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class MemorySampler(threading.Thread):
+    """Tracks peak RSS per gunicorn worker (Linux /proc only; reports null elsewhere)."""
+
+    def __init__(self, master_pid, interval=0.5):
+        super().__init__(daemon=True)
+        self.master_pid = master_pid
+        self.interval = interval
+        self.peak = {}
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        if not os.path.isdir("/proc"):
+            return
+        for pid in worker_pids(self.master_pid):
+            rss = rss_kb(pid)
+            if rss is not None:
+                self.peak[pid] = max(self.peak.get(pid, 0), rss)
+
+
+def synthetic_transcript(words):
+    return " ".join(f"word{i % 997}" for i in range(words))
+
+
+def build_request(rng, args, seq):
+    """Return (kind_label, path, body, stream) for one request drawn from the mix."""
+    kind = rng.choices(list(args.mix), weights=list(args.mix.values()))[0]
+    category = rng.choice(CATEGORIES)
+    # A share of repeated topics exercises the response cache; the rest are unique.
+    topic = f"topic {rng.randrange(20)}" if rng.random() < args.repeat else f"topic {seq}-{rng.random()}"
+    stream = rng.random() < args.stream
+    if kind == "solve":
+        style = rng.choice(STYLES)
+        return f"solve/{style}", "/api/solve", {"category": category, "style": style, "topic": topic}, stream
+    if kind == "learn":
+        return "learn", "/api/learn", {"category": category, "topic": topic}, stream
+    body = {"category": "generic", "topic": topic, "transcript": args.transcript}
+    return "summarize", "/api/summarize", body, stream
+
+
+def drive(base_url, args):
+    import requests
+
+    results = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.duration
+    counter = iter(range(10**9))
+
+    def client(index):
+        rng = random.Random(args.seed + index)
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            kind, path, body, stream = build_request(rng, args, next(counter))
+            url = base_url + path + ("?stream=1" if stream else "")
+            start = time.perf_counter()
+            first = None
+            try:
+                with session.post(url, json=body, stream=stream, timeout=args.timeout) as resp:
+                    if stream:
+                        for line in resp.iter_lines():
+                            if first is None and line.startswith(b"data:"):
+                                first = time.perf_counter() - start
+                    else:
+                        resp.content
+                    status = resp.status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - start
+            with lock:
+                results.append((kind, status, elapsed, first))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - started
+
+
+def percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+
+    def pick(p):
+        return round(values[min(len(values) - 1, int(len(values) * p))] * 1000, 1)
+
+    return {"n": len(values), "p50_ms": pick(0.50), "p95_ms": pick(0.95), "p99_ms": pick(0.99), "mean_ms": round(statistics.mean(values) * 1000, 1)}
+
+
+def report(results, wall, args, peak_rss):
+    ok = [r for r in results if r[1] == 200]
+    statuses = {}
+    for r in results:
+        statuses[str(r[1])] = statuses.get(str(r[1]), 0) + 1
+    by_kind = {}
+    for kind in sorted({r[0] for r in results}):
+        by_kind[kind] = percentiles([r[2] for r in ok if r[0] == kind])
+    first_tokens = [r[3] for r in ok if r[3] is not None]
+    return {
+        "config": {
+            "workers": args.workers,
+            "threads": args.threads,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "mix": args.mix,
+            "stream_fraction": args.stream,
+            "repeat_fraction": args.repeat,
+            "stub": {"latency_s": args.stub_latency, "tokens": args.stub_tokens, "rate": args.stub_rate},
+            "seed": args.seed,
+            "python": platform.python_version(),
+        },
+        "requests": len(results),
+        "ok": len(ok),
+        "statuses": statuses,
+        "throughput_rps": round(len(ok) / wall, 2),
+        "latency": percentiles([r[2] for r in ok]),
+        "latency_by_kind": by_kind,
+        "stream_first_token": percentiles(first_tokens),
+        "worker_peak_rss_kb": sorted(peak_rss.values()) or None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument("--threads", type=int, default=8, help="gunicorn threads per worker (gthread)")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent load-generator clients")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--mix", type=json.loads, default=DEFAULT_MIX, help='request weights, e.g. \'{"solve": 1}\'')
+    parser.add_argument("--stream", type=float, default=0.0, help="fraction of requests using SSE")
+    parser.add_argument("--repeat", type=float, default=0.0, help="fraction of requests reusing a small topic pool (cache hits)")
+    parser.add_argument("--transcript-words", type=int, default=3000)
+    parser.add_argument("--stub-latency", type=float, default=0.3, help="stub seconds before the first token")
+    parser.add_argument("--stub-tokens", type=int, default=200)
+    parser.add_argument("--stub-rate", type=float, default=200, help="stub tokens/sec (0 = unthrottled)")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mongo-uri", default=None, help="enable the Mongo cache tier and history")
+    parser.add_argument("--output", default=None, help="also write the JSON report to this file")
+    args = parser.parse_args()
+    args.transcript = synthetic_transcript(args.transcript_words)
+
+    stub_port, app_port = free_port(), free_port()
+    env = dict(os.environ)
+    env.pop("MONGO_URI", None)
+    env.update({
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "OPENAI_API_KEY": "loadtest",
+        # One load generator is one client address; keep per-client limits out of the measurement.
+        "ADMISSION_BUCKET_CAPACITY": env.get("ADMISSION_BUCKET_CAPACITY", str(10**9)),
+        "PYTHONUNBUFFERED": "1",
+    })
+    if args.mongo_uri:
+        env["MONGO_URI"] = args.mongo_uri
+
+    procs = []
+    try:
+        procs.append(subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, "benchmarks", "stub_llm.py"), "--port", str(stub_port),
+             "--latency", str(args.stub_latency), "--tokens", str(args.stub_tokens), "--rate", str(args.stub_rate)],
+            env=env, stdout=subprocess.DEVNULL,
+        ))
+        gunicorn = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "app:app", "--bind", f"127.0.0.1:{app_port}",
+             "--workers", str(args.workers), "--threads", str(args.threads), "--worker-class", "gthread",
+             "--timeout", str(int(args.timeout) + 30), "--log-level", "warning"],
+            cwd=ROOT, env=env,
+        )
+        procs.append(gunicorn)
+        base_url = f"http://127.0.0.1:{app_port}"
+        wait_for(f"http://127.0.0.1:{stub_port}/")
+        wait_for(base_url + "/")
+
+        sampler = MemorySampler(gunicorn.pid)
+        sampler.start()
+        results, wall = drive(base_url, args)
+        sampler.sample()
+        sampler.stopped.set()
+        out = report(results, wall, args, sampler.peak)
+    finally:
+        for proc in reversed(procs):
+            proc.terminate()
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+    text = json.dumps(out, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
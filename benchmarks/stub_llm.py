@@ -0,0 +1,119 @@
+# benchmarks/stub_llm.py
+"""
+Local stand-in for the OpenAI chat-completions API, for benchmarks.
+Answers POST /v1/chat/completions (streaming and non-streaming) with a synthetic
+completion after a configurable first-token latency and at a configurable token rate,
+optionally failing a fraction of calls (or the first `fail_first` calls) with 503. Counts calls and TCP connections.
+
+    python benchmarks/stub_llm.py --port 8089 --latency 0.3 --tokens 250 --rate 80
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python app.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.3, tokens=250, rate=80.0, error_rate=0.0, fail_first=0):
+        super().__init__(address, StubLLMHandler)
+        self.latency = latency
+        self.tokens = tokens
+        self.rate = rate
+        self.error_rate = error_rate
+        self.fail_first = fail_first
+        self.hits = 0
+        self.errors = 0
+        self.cancelled = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def process_request(self, request, client_address):
+        self.count("connections")
+        super().process_request(request, client_address)
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        srv = self.server
+        srv.count("hits")
+        if srv.hits <= srv.fail_first or (srv.error_rate and random.random() < srv.error_rate):
+            srv.count("errors")
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        time.sleep(srv.latency)
+        words = [f"tok{i} " for i in range(srv.tokens)]
+        if not body.get("stream"):
+            time.sleep(srv.tokens / srv.rate if srv.rate else 0)
+            payload = json.dumps({"choices": [{"message": {"role": "assistant", "content": "".join(words)}}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            for word in words:
+                chunk = {"choices": [{"delta": {"content": word}}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                if srv.rate:
+                    time.sleep(1 / srv.rate)
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            srv.count("cancelled")
+
+
+def start(port=0, **kwargs):
+    """Start a stub server on a background thread; returns the server (use .base_url, .shutdown())."""
+    server = StubLLMServer(("127.0.0.1", port), **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds before the first token")
+    parser.add_argument("--tokens", type=int, default=250, help="tokens per completion")
+    parser.add_argument("--rate", type=float, default=80.0, help="tokens per second (0 = unthrottled)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    args = parser.parse_args()
+    server = StubLLMServer(
+        ("127.0.0.1", args.port), latency=args.latency, tokens=args.tokens, rate=args.rate, error_rate=args.error_rate
+    )
+    print(f"stub LLM listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+# cache.py
+"""
+Two-tier response cache for generated solutions, explanations and summaries.
+- L1: bounded in-process LRU with TTL, one per gunicorn worker.
+- L2: shared MongoDB collection (MONGO_URI) with a TTL index and size-based eviction.
+Keys are the normalized (category, type_key, style, topic) that get_prompt resolves,
+plus a transcript hash for summaries.
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from db import get_database
+from prompts import resolve_key
+
+DEFAULT_TTL = int(os.getenv("CACHE_TTL_SECONDS", 7 * 24 * 3600))
+DEFAULT_L1_SIZE = int(os.getenv("CACHE_L1_SIZE", 1024))
+DEFAULT_L2_MAX_DOCS = int(os.getenv("CACHE_L2_MAX_DOCS", 100000))
+# After an L2 error, skip MongoDB for this many seconds instead of paying its timeout per request.
+DEFAULT_L2_BACKOFF = float(os.getenv("CACHE_L2_BACKOFF", 30))
+
+
+def make_key(category, type_key, style, topic, transcript=None):
+    """
+    Build a stable cache key; equivalent requests (whitespace, category/style case, unused style)
+    share one key. Topic case is kept: "10 mA" and "10 MA" are different questions.
+    """
+    resolved = resolve_key(category, type_key, style or "", transcript)
+    if resolved is None:
+        resolved = ((category or "").lower(), type_key, (style or "").lower())
+    parts = [repr(resolved), " ".join(str(topic).split())]
+    if resolved[1] == "summary" and transcript:
+        parts.append(hashlib.sha256(transcript.encode("utf-8")).hexdigest())
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe LRU with per-entry TTL."""
+
+    def __init__(self, maxsize=DEFAULT_L1_SIZE, ttl=DEFAULT_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class MongoCache:
+    """
+    Shared cache tier backed by a MongoDB collection. Expiry is left to a TTL index on
+    `expires_at`; every `trim_every` writes the oldest documents beyond `max_docs` are dropped.
+    Indexes are built by ensure_indexes(), normally from a background thread (build_indexes_async).
+    """
+
+    def __init__(self, collection, ttl=DEFAULT_TTL, max_docs=DEFAULT_L2_MAX_DOCS, trim_every=100):
+        self.collection = collection
+        self.ttl = ttl
+        self.max_docs = max_docs
+        self.trim_every = trim_every
+        self.evictions = 0
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._indexed = False
+
+    def ensure_indexes(self):
+        if not self._indexed:
+            self.collection.create_index("expires_at", expireAfterSeconds=0)
+            self.collection.create_index("created_at")
+            self._indexed = True
+
+    def build_indexes_async(self, retry_delay=30):
+        """Create the indexes off the request path, retrying until MongoDB is reachable."""
+        def run():
+            while not self._indexed:
+                try:
+                    self.ensure_indexes()
+                except Exception:
+                    time.sleep(retry_delay)
+
+        threading.Thread(target=run, name="cache-indexes", daemon=True).start()
+
+    def get(self, key):
+        doc = self.collection.find_one({"_id": key}, {"value": 1, "expires_at": 1})
+        if doc is None:
+            return None
+        # The TTL monitor only runs once a minute, so double-check expiry here.
+        expires = doc["expires_at"]
+        if expires.tzinfo is None:
+            expires = expires.replace(tzinfo=timezone.utc)
+        if expires <= datetime.now(timezone.utc):
+            return None
+        return doc["value"]
+
+    def set(self, key, value, ttl=None):
+        now = datetime.now(timezone.utc)
+        expires = now + timedelta(seconds=self.ttl if ttl is None else ttl)
+        self.collection.replace_one(
+            {"_id": key}, {"value": value, "created_at": now, "expires_at": expires}, upsert=True
+        )
+        with self._lock:
+            self._writes += 1
+            trim = self._writes % self.trim_every == 0
+        if trim:
+            self.trim()
+
+    def trim(self):
+        excess = self.collection.estimated_document_count() - self.max_docs
+        if excess <= 0:
+            return 0
+        oldest = [d["_id"] for d in self.collection.find({}, {"_id": 1}).sort("created_at", 1).limit(excess)]
+        removed = self.collection.delete_many({"_id": {"$in": oldest}}).deleted_count if oldest else 0
+        with self._lock:
+            self.evictions += removed
+        return removed
+
+
+class ResponseCache:
+    """
+    L1 LRU in front of an optional MongoCache; L2 hits are promoted into L1.
+    An L2 error opens a simple circuit: L2 is skipped for `l2_backoff` seconds, then retried.
+    """
+
+    def __init__(self, l1=None, l2=None, l2_backoff=DEFAULT_L2_BACKOFF):
+        self.l1 = l1 if l1 is not None else LRUCache()
+        self.l2 = l2
+        self.l2_backoff = l2_backoff
+        self._l2_retry_at = 0.0
+        self._lock = threading.Lock()
+        self.hits_l1 = 0
+        self.hits_l2 = 0
+        self.misses = 0
+        self.errors = 0
+        self.l2_skipped = 0
+
+    def get(self, key):
+        value = self.l1.get(key)
+        if value is not None:
+            self._count("hits_l1")
+            return value
+        if self._l2_available():
+            try:
+                value = self.l2.get(key)
+            except Exception:
+                # A flaky Mongo must never fail the request; treat it as a miss.
+                self._l2_failed()
+                value = None
+            if value is not None:
+                self._count("hits_l2")
+                self.l1.set(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.l1.set(key, value)
+        if self._l2_available():
+            try:
+                self.l2.set(key, value)
+            except Exception:
+                self._l2_failed()
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = self.compute(key, compute)
+        return value
+
+    def compute(self, key, compute):
+        """Compute and store a value after the caller's own get() missed; no second lookup."""
+        value = compute()
+        if value:
+            self.set(key, value)
+        return value
+
+    def stats(self):
+        return {
+            "hits_l1": self.hits_l1,
+            "hits_l2": self.hits_l2,
+            "misses": self.misses,
+            "errors": self.errors,
+            "l2_skipped": self.l2_skipped,
+            "evictions_l1": self.l1.evictions,
+            "evictions_l2": self.l2.evictions if self.l2 is not None else 0,
+            "size_l1": len(self.l1),
+        }
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def _l2_available(self):
+        if self.l2 is None:
+            return False
+        if time.monotonic() < self._l2_retry_at:
+            self._count("l2_skipped")
+            return False
+        return True
+
+    def _l2_failed(self):
+        self._count("errors")
+        self._l2_retry_at = time.monotonic() + self.l2_backoff
+
+
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Per-process ResponseCache; the MongoDB tier is used when MONGO_URI is set (see db.py)."""
+    global _cache, _cache_pid
+    if _cache is not None and _cache_pid == os.getpid():
+        return _cache
+    with _cache_lock:
+        if _cache is None or _cache_pid != os.getpid():
+            database = get_database()
+            l2 = None
+            if database is not None:
+                l2 = MongoCache(database[os.getenv("CACHE_COLLECTION", "response_cache")])
+                l2.build_indexes_async()
+            _cache = ResponseCache(l2=l2)
+            _cache_pid = os.getpid()
+    return _cache
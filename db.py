@@ -0,0 +1,31 @@
+# db.py
+"""
+Lazily created, per-process MongoDB handle shared by the response cache and query history.
+The MongoClient is built on first use inside each gunicorn worker (after fork), so connection
+pools are never shared across processes. Datetimes come back timezone-aware (UTC).
+get_database() returns None when MONGO_URI is not configured.
+"""
+
+import os
+import threading
+
+MONGO_DB = os.getenv("MONGO_DB", "vikal")
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_database():
+    global _client, _client_pid
+    uri = os.getenv("MONGO_URI")
+    if not uri:
+        return None
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                from pymongo import MongoClient
+
+                _client = MongoClient(uri, connect=False, tz_aware=True, serverSelectionTimeoutMS=2000)
+                _client_pid = os.getpid()
+    return _client[MONGO_DB]
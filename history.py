@@ -0,0 +1,216 @@
+# history.py
+"""
+Write-behind query history in MongoDB (MONGO_URI).
+- record() only appends to an in-memory buffer; a background thread flushes it with an
+  unordered insert_many when HISTORY_BATCH_SIZE records are waiting or every
+  HISTORY_FLUSH_INTERVAL seconds, so no request waits on a database round-trip.
+- The buffer is bounded; if MongoDB is unreachable the oldest records are dropped and counted.
+- Remaining records are flushed at interpreter exit (gunicorn worker shutdown).
+- page() serves history newest-first with keyset pagination on (created_at, _id).
+- `user` is the id from a verified user token (identity.py) or None; client addresses are never stored.
+"""
+
+import atexit
+import base64
+import json
+import os
+import threading
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+from db import get_database
+
+BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 200))
+FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", 2))
+MAX_BUFFER = int(os.getenv("HISTORY_MAX_BUFFER", 20000))
+HISTORY_COLLECTION = os.getenv("HISTORY_COLLECTION", "history")
+MAX_PAGE = 100
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+class CursorError(ValueError):
+    """Raised for a malformed pagination cursor."""
+
+
+def ensure_indexes(collection):
+    from pymongo import ASCENDING, DESCENDING
+
+    # (user, created_at) serves per-user history; _id makes the keyset sort fully indexed.
+    collection.create_index([("user", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="user_created_at")
+    collection.create_index([("category", ASCENDING), ("style", ASCENDING)], name="category_style")
+
+
+class HistoryWriter:
+    """
+    Buffers history records and writes them in batches. `get_collection` is called lazily from
+    the flush thread so the MongoClient is created inside the worker process that uses it.
+    """
+
+    def __init__(self, get_collection, batch_size=BATCH_SIZE, interval=FLUSH_INTERVAL, max_buffer=MAX_BUFFER):
+        self.get_collection = get_collection
+        self.batch_size = batch_size
+        self.interval = interval
+        self._buffer = deque(maxlen=max_buffer)
+        self._wakeup = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._indexed = False
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def record(self, doc):
+        from bson import ObjectId
+
+        doc.setdefault("_id", ObjectId())
+        doc.setdefault("created_at", datetime.now(timezone.utc))
+        if len(self._buffer) == self._buffer.maxlen:
+            self.dropped += 1
+        self._buffer.append(doc)
+        self._ensure_thread()
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self):
+        """Write everything buffered so far; returns the number of records written."""
+        from pymongo.errors import BulkWriteError, PyMongoError
+
+        written = 0
+        with self._flush_lock:
+            while self._buffer:
+                batch = []
+                while self._buffer and len(batch) < self.batch_size:
+                    batch.append(self._buffer.popleft())
+                try:
+                    collection = self.get_collection()
+                    if not self._indexed:
+                        ensure_indexes(collection)
+                        self._indexed = True
+                    collection.insert_many(batch, ordered=False)
+                    written += len(batch)
+                except BulkWriteError as e:
+                    # Unordered: everything else in the batch was written. Duplicate _ids come from
+                    # retrying a batch that partly landed before a network error, so they count as
+                    # written; any other per-document failure would fail again and is dropped.
+                    errors = e.details.get("writeErrors", [])
+                    rejected = sum(1 for err in errors if err.get("code") != 11000)
+                    written += len(batch) - rejected
+                    self.dropped += rejected
+                    self.errors += 1
+                except PyMongoError:
+                    # Database unreachable: put the batch back and retry on the next tick.
+                    self.errors += 1
+                    room = self._buffer.maxlen - len(self._buffer)
+                    self.dropped += max(0, len(batch) - room)
+                    self._buffer.extendleft(reversed(batch[:room]))
+                    break
+                except Exception:
+                    # Not a connectivity problem (e.g. bson InvalidDocument): a retry would fail
+                    # the same way, so the batch is dropped.
+                    self.errors += 1
+                    self.dropped += len(batch)
+        self.written += written
+        return written
+
+    def pending(self):
+        return len(self._buffer)
+
+    def stats(self):
+        return {"pending": len(self._buffer), "written": self.written, "dropped": self.dropped, "errors": self.errors}
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._thread_lock:
+            if self._thread is None or self._pid != os.getpid():
+                # After fork the parent's thread does not exist in this process; start our own.
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self._buffer:
+                try:
+                    self.flush()
+                except Exception:
+                    # Never let an unexpected error end the thread: history would silently stop.
+                    self.errors += 1
+
+
+def encode_cursor(doc):
+    # MongoDB stores milliseconds; integer ms round-trips exactly.
+    ms = (doc["created_at"] - EPOCH) // timedelta(milliseconds=1)
+    raw = json.dumps({"t": ms, "id": str(doc["_id"])})
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    from bson import ObjectId
+
+    try:
+        raw = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return EPOCH + timedelta(milliseconds=int(raw["t"])), ObjectId(raw["id"])
+    except Exception as e:
+        raise CursorError("invalid cursor") from e
+
+
+def page(collection, user, limit=20, cursor=None):
+    """
+    Return (docs, next_cursor) for a user's history, newest first. Each page continues strictly
+    after the previous page's last (created_at, _id), so deep pages cost the same as the first.
+    """
+    from pymongo import DESCENDING
+
+    limit = max(1, min(int(limit), MAX_PAGE))
+    query = {"user": user}
+    if cursor:
+        created_at, last_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": last_id}},
+        ]
+    docs = list(
+        collection.find(query).sort([("created_at", DESCENDING), ("_id", DESCENDING)]).limit(limit + 1)
+    )
+    next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+def get_collection():
+    database = get_database()
+    if database is None:
+        raise RuntimeError("MONGO_URI is not configured")
+    return database[HISTORY_COLLECTION]
+
+
+_writer = HistoryWriter(get_collection)
+
+
+def record(user, category, type_key, style, topic, answer, cached=False):
+    """Queue a history record; a no-op when MONGO_URI is not configured."""
+    if not os.getenv("MONGO_URI"):
+        return
+    _writer.record({
+        "user": user,
+        "category": category,
+        "type": type_key,
+        "style": style,
+        "topic": topic,
+        "answer": answer,
+        "cached": cached,
+    })
+
+
+def stats():
+    return _writer.stats()
+
+
+@atexit.register
+def _flush_on_exit():
+    if _writer.pending():
+        _writer.flush()
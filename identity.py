@@ -0,0 +1,54 @@
+# identity.py
+"""
+Server-issued user tokens, the identity behind per-user query history.
+- issue() mints a random user id and signs it with HMAC-SHA256 under USER_TOKEN_SECRET; the
+  frontend keeps the token and sends it back in the X-User-Token header.
+- verify() returns the user id for a token this server signed and None for anything else, so a
+  client can only read the history of a token it was issued. Client-chosen ids (X-User-Id) and
+  client addresses are never used as identities.
+Without USER_TOKEN_SECRET no tokens are issued or accepted, and history is anonymous.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+
+HEADER = "X-User-Token"
+
+
+def _secret():
+    secret = os.getenv("USER_TOKEN_SECRET", "")
+    return secret.encode("utf-8") if secret else None
+
+
+def _sign(secret, user):
+    digest = hmac.new(secret, user.encode("ascii"), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def enabled():
+    return _secret() is not None
+
+
+def issue():
+    """Return a new signed token "<user>.<signature>"; raises RuntimeError when tokens are disabled."""
+    secret = _secret()
+    if secret is None:
+        raise RuntimeError("USER_TOKEN_SECRET is not configured")
+    user = secrets.token_urlsafe(16)
+    return f"{user}.{_sign(secret, user)}"
+
+
+def verify(token):
+    """Return the user id carried by a valid token, else None."""
+    secret = _secret()
+    if secret is None or not token:
+        return None
+    user, _, signature = token.strip().rpartition(".")
+    if not user or not user.isascii():
+        return None
+    if not hmac.compare_digest(signature.encode("ascii", "replace"), _sign(secret, user).encode("ascii")):
+        return None
+    return user
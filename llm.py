@@ -0,0 +1,248 @@
+# llm.py
+"""
+OpenAI chat-completions client shared by the Solve/Learn/Summarize routes.
+- complete(): blocking call, returns the full completion text. Identical prompts in flight at
+  the same time are coalesced into one upstream call (single-flight).
+- stream(): yields content tokens as they arrive; closing the generator aborts the upstream call.
+All calls go through one keep-alive requests.Session per worker process, with a capped
+connection pool (a bounded wait for a free connection), timeouts and jittered exponential backoff.
+Only failures before the request reached upstream (connect timeout, connection refused) and
+429/5xx are retried; a read timeout may already have been billed and fails the call.
+Configured via OPENAI_API_KEY, OPENAI_BASE_URL (point at a stub server for benchmarks) and OPENAI_MODEL.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, EmptyPoolError
+
+import metrics
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))
+POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", 16))
+# Seconds a caller waits for a free pooled connection before the call fails.
+POOL_TIMEOUT = float(os.getenv("LLM_POOL_TIMEOUT", 10))
+MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", 0.5))
+BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", 8))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class LLMError(Exception):
+    """Raised when the upstream completion call fails."""
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def _bounded(pool_class):
+    """A urllib3 pool class whose blocking wait for a connection gives up after POOL_TIMEOUT."""
+    class BoundedPool(pool_class):
+        def urlopen(self, *args, pool_timeout=None, **kwargs):
+            return super().urlopen(*args, pool_timeout=POOL_TIMEOUT if pool_timeout is None else pool_timeout, **kwargs)
+
+    return BoundedPool
+
+
+class PoolAdapter(HTTPAdapter):
+    """HTTPAdapter whose pools raise EmptyPoolError instead of blocking forever when full."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _bounded(HTTPConnectionPool),
+            "https": _bounded(HTTPSConnectionPool),
+        }
+
+
+def get_session():
+    """
+    Per-process keep-alive Session, created lazily after gunicorn forks. pool_block caps
+    concurrent upstream connections at POOL_SIZE; extra callers wait up to POOL_TIMEOUT
+    for a free connection.
+    """
+    global _session, _session_pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            session = requests.Session()
+            adapter = PoolAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, pool_block=True, max_retries=0)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session, _session_pid = session, os.getpid()
+    return _session
+
+
+def backoff_delay(attempt, retry_after=None):
+    """Full-jitter exponential backoff; an upstream Retry-After (seconds) is used as a floor."""
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, min(float(retry_after), BACKOFF_MAX))
+        except ValueError:
+            pass
+    return delay
+
+
+def _not_sent(error):
+    """True if the request never reached upstream, so retrying cannot double-bill it."""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    if not isinstance(error, requests.ConnectionError):
+        return False
+    # Connection refused / DNS failure: urllib3 reports NewConnectionError, a ConnectTimeoutError.
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, ConnectTimeoutError)
+
+
+def _request(prompt, stream):
+    headers = {"Authorization": f"Bearer {os.getenv('OPENAI_API_KEY', '')}"}
+    payload = {
+        "model": OPENAI_MODEL,
+        "messages": [{"role": "user", "content": prompt}],
+        "stream": stream,
+    }
+    session = get_session()
+    for attempt in range(MAX_RETRIES + 1):
+        last = attempt == MAX_RETRIES
+        try:
+            resp = session.post(
+                f"{OPENAI_BASE_URL}/chat/completions",
+                json=payload,
+                headers=headers,
+                stream=stream,
+                timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+        except EmptyPoolError as e:
+            raise LLMError(f"no free upstream connection within {POOL_TIMEOUT}s") from e
+        except requests.RequestException as e:
+            if last or not _not_sent(e):
+                raise LLMError(str(e)) from e
+            time.sleep(backoff_delay(attempt))
+            continue
+        if resp.status_code == 200:
+            return resp
+        body = resp.text[:500]
+        resp.close()
+        if resp.status_code not in RETRY_STATUSES or last:
+            raise LLMError(f"upstream returned {resp.status_code}: {body}")
+        time.sleep(backoff_delay(attempt, resp.headers.get("Retry-After")))
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key: the first caller runs the function and
+    every caller that arrives while it is running gets the same result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+            else:
+                self.coalesced += 1
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+        try:
+            call["result"] = fn()
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+        return call["result"]
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+_flights = SingleFlight()
+
+
+def flight_stats():
+    return {"in_flight": _flights.in_flight(), "coalesced": _flights.coalesced}
+
+
+def _complete(prompt):
+    start = time.perf_counter()
+    try:
+        resp = _request(prompt, stream=False)
+        try:
+            return resp.json()["choices"][0]["message"]["content"]
+        except (ValueError, KeyError, IndexError) as e:
+            raise LLMError(f"malformed upstream response: {e}") from e
+    except LLMError:
+        metrics.UPSTREAM_ERRORS.inc("complete")
+        raise
+    finally:
+        metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start, "complete")
+
+
+def complete(prompt):
+    key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return _flights.do(key, lambda: _complete(prompt))
+
+
+def stream(prompt):
+    """
+    Yield content deltas from a streaming completion. Tokens are read from the socket
+    only as the consumer pulls them, so a slow client applies backpressure upstream;
+    if the consumer closes the generator (client disconnect) the connection is dropped.
+    """
+    start = time.perf_counter()
+    first = True
+    try:
+        resp = _request(prompt, stream=True)
+    except LLMError:
+        metrics.UPSTREAM_ERRORS.inc("stream")
+        raise
+    try:
+        for line in resp.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data:"):
+                continue
+            data = line[5:].strip()
+            if data == "[DONE]":
+                break
+            try:
+                delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+            except (ValueError, KeyError, IndexError) as e:
+                raise LLMError(f"malformed upstream chunk: {e}") from e
+            if delta:
+                if first:
+                    metrics.UPSTREAM_TTFT.observe(time.perf_counter() - start)
+                    first = False
+                yield delta
+    except requests.RequestException as e:
+        metrics.UPSTREAM_ERRORS.inc("stream")
+        raise LLMError(str(e)) from e
+    except LLMError:
+        metrics.UPSTREAM_ERRORS.inc("stream")
+        raise
+    finally:
+        resp.close()
+        metrics.UPSTREAM_LATENCY.observe(time.perf_counter() - start, "stream")
@@ -0,0 +1,236 @@
+# metrics.py
+"""
+In-process metrics in Prometheus text format, served at /metrics.
+- Counters and histograms are plain dict/list updates behind one short, uncontended lock each,
+  so observing costs well under a microsecond on the request path.
+- Gauges are callbacks read only at scrape time (cache stats, admission queue, in-flight).
+- Every series carries a `worker` label (the pid): each gunicorn worker keeps its own numbers,
+  and a scrape sees whichever worker answered.
+Optional sampling profiler: set VIKAL_PROFILE_SLOW_MS to collect stacks of in-flight requests
+and dump requests slower than that, in folded (flamegraph.pl / speedscope) format, to
+VIKAL_PROFILE_DIR.
+"""
+
+import bisect
+import collections
+import os
+import sys
+import threading
+import time
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+PROFILE_SLOW_MS = float(os.getenv("VIKAL_PROFILE_SLOW_MS", 0))
+PROFILE_DIR = os.getenv("VIKAL_PROFILE_DIR", "/tmp/vikal-profiles")
+PROFILE_INTERVAL = float(os.getenv("VIKAL_PROFILE_INTERVAL_MS", 5)) / 1000
+
+
+def _labels(names, values):
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self, worker):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for values, count in sorted(snapshot.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels + ('worker',), values + (worker,))}}} {count}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum; cumulated at render time.
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def time(self, *label_values):
+        return _Timer(self, label_values)
+
+    def render(self, worker):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        names = self.labels + ("worker",)
+        for values, series in sorted(snapshot.items()):
+            base = _labels(names, values + (worker,))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram, label_values):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+class Gauge:
+    """
+    Read at scrape time from a callback returning {label_values_tuple: value}. `type` may be
+    "counter" for totals that another module already keeps (e.g. cache hits).
+    """
+
+    def __init__(self, name, help, labels, collect, type="gauge"):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.collect = collect
+        self.type = type
+
+    def render(self, worker):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        try:
+            values = self.collect()
+        except Exception:
+            return lines
+        for label_values, value in sorted(values.items()):
+            lines.append(f"{self.name}{{{_labels(self.labels + ('worker',), label_values + (worker,))}}} {value}")
+        return lines
+
+
+REQUEST_LATENCY = Histogram("vikal_request_duration_seconds", "Request latency until the response is closed.", ("route", "status"))
+UPSTREAM_LATENCY = Histogram("vikal_upstream_duration_seconds", "Upstream LLM call latency.", ("kind",))
+UPSTREAM_TTFT = Histogram("vikal_upstream_time_to_first_token_seconds", "Upstream time to first streamed token.")
+UPSTREAM_ERRORS = Counter("vikal_upstream_errors_total", "Failed upstream LLM calls.", ("kind",))
+PROMPT_SIZE = Histogram("vikal_prompt_chars", "Rendered prompt size in characters.", ("category", "type", "style"), SIZE_BUCKETS)
+
+_in_flight = [0]
+_in_flight_lock = threading.Lock()
+_gauges = []
+
+
+def register_gauge(name, help, labels, collect, type="gauge"):
+    _gauges.append(Gauge(name, help, labels, collect, type))
+
+
+register_gauge("vikal_requests_in_flight", "Requests currently being served by this worker.", (), lambda: {(): _in_flight[0]})
+
+
+def request_started():
+    with _in_flight_lock:
+        _in_flight[0] += 1
+    if _profiler is not None:
+        _profiler.start(threading.get_ident())
+    return time.perf_counter()
+
+
+def request_finished(start, route, status):
+    elapsed = time.perf_counter() - start
+    with _in_flight_lock:
+        _in_flight[0] -= 1
+    REQUEST_LATENCY.observe(elapsed, route, status)
+    if _profiler is not None:
+        _profiler.finish(threading.get_ident(), route, elapsed)
+
+
+def render():
+    worker = str(os.getpid())
+    lines = []
+    for metric in (REQUEST_LATENCY, UPSTREAM_LATENCY, UPSTREAM_TTFT, UPSTREAM_ERRORS, PROMPT_SIZE, *_gauges):
+        lines.extend(metric.render(worker))
+    return "\n".join(lines) + "\n"
+
+
+class SamplingProfiler:
+    """
+    Samples the stacks of threads serving requests every PROFILE_INTERVAL seconds. Stacks of
+    requests slower than the threshold are appended to <dir>/profile-<pid>.folded as
+    "route;frame;frame... count" lines; faster requests' samples are discarded.
+    """
+
+    def __init__(self, slow_ms, out_dir, interval=PROFILE_INTERVAL):
+        self.slow = slow_ms / 1000
+        self.out_dir = out_dir
+        self.interval = interval
+        self._stacks = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, ident):
+        with self._lock:
+            self._stacks[ident] = collections.Counter()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="vikal-profiler", daemon=True)
+                self._thread.start()
+
+    def finish(self, ident, route, elapsed):
+        with self._lock:
+            stacks = self._stacks.pop(ident, None)
+        if stacks and elapsed >= self.slow:
+            self._dump(route, stacks)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                idents = list(self._stacks)
+            if not idents:
+                continue
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                with self._lock:
+                    counter = self._stacks.get(ident)
+                    if counter is not None:
+                        counter[";".join(reversed(stack))] += 1
+
+    def _dump(self, route, stacks):
+        os.makedirs(self.out_dir, exist_ok=True)
+        path = os.path.join(self.out_dir, f"profile-{os.getpid()}.folded")
+        with open(path, "a") as f:
+            for stack, count in stacks.items():
+                f.write(f"{route};{stack} {count}\n")
+
+
+_profiler = SamplingProfiler(PROFILE_SLOW_MS, PROFILE_DIR) if PROFILE_SLOW_MS > 0 else None
@@ -5,6 +5,8 @@ Centralized prompt templates for VIKAL's queries.
 - Exams (UPSC, GATE, RRB): Detailed, exam-focused solutions for Solve mode.
 """
 
+from string import Formatter
+
 PROMPTS = {
     "generic": {
         "explanation": """
@@ -186,14 +188,106 @@ Instructions:
     }
 }
 
+# Map step of the long-transcript summary pipeline (transcripts.py); the reduce step uses PROMPTS["generic"]["summary"].
+CHUNK_SUMMARY_PROMPT = """
+Summarize this part ({start}-{end}) of the YouTube video "{topic}" for a student.
+- List the 3-6 most important points, each prefixed with its approximate timestamp.
+- Note any key terms, formulas or acronyms with a one-line definition.
+- Keep it under 150 words and use only what this part of the transcript says.
+
+Transcript part:
+{transcript}
+"""
+
+
+class PromptTemplate:
+    """
+    A template compiled once at import: static text is pre-split around its
+    placeholders so rendering is a single join instead of a str.format parse.
+    """
+
+    __slots__ = ("key", "source", "segments", "fields", "static_chars", "token_estimate", "_slots")
+
+    def __init__(self, key, source):
+        self.key = key
+        self.source = source
+        segments = []
+        fields = []
+        for literal, field, _spec, _conv in Formatter().parse(source):
+            if literal:
+                segments.append(literal)
+            if field is not None:
+                fields.append(field)
+                segments.append(None)
+        self.segments = tuple(segments)
+        self.fields = tuple(fields)
+        # (position, field) for each placeholder, so render fills a copy of segments in place.
+        self._slots = tuple(zip((i for i, seg in enumerate(segments) if seg is None), fields))
+        self.static_chars = sum(len(s) for s in segments if s is not None)
+        # Rough ~4 chars/token heuristic; good enough for budgeting, not billing.
+        self.token_estimate = (self.static_chars + 3) // 4
+
+    def render(self, **values):
+        out = list(self.segments)
+        for i, field in self._slots:
+            out[i] = str(values[field])
+        return "".join(out)
+
+    def __repr__(self):
+        return f"PromptTemplate({self.key!r}, ~{self.token_estimate} tokens)"
+
+
+def _compile_registry(prompts):
+    """Flatten PROMPTS into {(category, type_key, style): PromptTemplate}. Explanation/summary use style None."""
+    registry = {}
+    for type_key in ("explanation", "summary"):
+        key = ("generic", type_key, None)
+        registry[key] = PromptTemplate(key, prompts["generic"][type_key])
+    for style, source in prompts["generic"]["solution"].items():
+        key = ("generic", "solution", style)
+        registry[key] = PromptTemplate(key, source)
+    for exam, types in prompts["exams"].items():
+        for type_key, styles in types.items():
+            for style, source in styles.items():
+                key = (exam, type_key, style)
+                registry[key] = PromptTemplate(key, source)
+    return registry
+
+
+REGISTRY = _compile_registry(PROMPTS)
+FALLBACK = PromptTemplate(("fallback", None, None), "Solve {topic} with style {style}.")
+CHUNK_SUMMARY = PromptTemplate(("generic", "summary_chunk", None), CHUNK_SUMMARY_PROMPT)
+EXAM_CATEGORIES = frozenset(["upsc", "gate", "rrb"])
+
+
+def resolve_key(category, type_key, style, transcript=None):
+    """
+    Return the REGISTRY key get_prompt renders for these arguments, or None when
+    it falls back to the FALLBACK "Solve {topic} with style {style}." prompt.
+    """
+    if type_key == "explanation":
+        return ("generic", "explanation", None)
+    elif type_key == "summary" and transcript:
+        return ("generic", "summary", None)
+    if category in EXAM_CATEGORIES:
+        # get_prompt has always looked exam templates up under PROMPTS["exams"][type_key],
+        # which never matches, so exam categories resolve to the fallback prompt.
+        return None
+    key = ("generic", type_key, style.lower())
+    return key if key in REGISTRY else None
+
+
 def get_prompt(category, type_key, style, topic, transcript=None):
     """
     Fetch the appropriate prompt based on category (exam/generic), type (solution/explanation/summary), style, and topic.
     Default to generic explanation if type matches, regardless of style or category.
+    Renders from the precompiled REGISTRY/FALLBACK templates. User text is inserted literally,
+    never re-parsed as a format string, so topics with braces (e.g. LaTeX) are safe.
     """
-    if type_key == "explanation":
-        return PROMPTS["generic"]["explanation"].format(topic=topic)
-    elif type_key == "summary" and transcript:
-        return PROMPTS["generic"]["summary"].format(topic=topic, transcript=transcript)
-    section = "exams" if category in ["upsc", "gate", "rrb"] else "generic"
-    return PROMPTS.get(section, {}).get(type_key, {}).get(style.lower(), f"Solve {topic} with style {style}.").format(topic=topic)
\ No newline at end of file
+    if category in EXAM_CATEGORIES and type_key not in ("explanation", "summary"):
+        # Exam solutions always use FALLBACK (see resolve_key); skip the lookup on the hot path.
+        return FALLBACK.render(topic=topic, style=style)
+    key = resolve_key(category, type_key, style, transcript)
+    if key is not None:
+        return REGISTRY[key].render(topic=topic, transcript=transcript)
+    return FALLBACK.render(topic=topic, style=style)
@@ -0,0 +1,94 @@
+"""In-memory stand-ins for the slice of the pymongo Collection API the app uses."""
+
+import copy
+
+
+def matches(doc, query):
+    """Equality, $lt, $in and $or: the query operators the app uses."""
+    for field, cond in query.items():
+        if field == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = doc.get(field)
+            if "$lt" in cond and not (value is not None and value < cond["$lt"]):
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+        elif doc.get(field) != cond:
+            return False
+    return True
+
+
+class FakeResult:
+    def __init__(self, deleted_count=0):
+        self.deleted_count = deleted_count
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self.docs.sort(key=lambda d: d[field], reverse=order < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def __iter__(self):
+        return iter(self.docs)
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}
+        self.indexes = []
+        self.calls = 0
+
+    def create_index(self, keys, **kwargs):
+        self.calls += 1
+        self.indexes.append((keys, kwargs))
+
+    def find_one(self, query, projection=None):
+        self.calls += 1
+        doc = self.docs.get(query["_id"])
+        return copy.deepcopy(doc) if doc is not None else None
+
+    def replace_one(self, query, doc, upsert=False):
+        self.calls += 1
+        self.docs[query["_id"]] = dict(doc, _id=query["_id"])
+
+    def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query=None, projection=None):
+        self.calls += 1
+        return FakeCursor([copy.deepcopy(d) for d in self.docs.values() if matches(d, query or {})])
+
+    def insert_many(self, docs, ordered=True):
+        self.calls += 1
+        for doc in docs:
+            self.docs[doc["_id"]] = copy.deepcopy(doc)
+
+    def delete_many(self, query):
+        ids = [i for i, d in self.docs.items() if matches(d, query)]
+        for i in ids:
+            del self.docs[i]
+        return FakeResult(len(ids))
+
+
+class BrokenCollection:
+    """Every call fails, like a collection whose server is unreachable."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def fail(*args, **kwargs):
+            self.calls += 1
+            raise ConnectionError("mongo unreachable")
+        return fail
@@ -0,0 +1,138 @@
+import threading
+import time
+
+import pytest
+
+import admission
+
+
+def test_missing_style_costs_the_default_style():
+    assert admission.cost_of("solution") == admission.cost_of("solution", "") == admission.OUTPUT_TOKENS[("solution", "smart")]
+
+
+@pytest.mark.parametrize("style", [5, ["smart"], {"a": 1}, "weird"])
+def test_unknown_or_non_string_style_costs_default(style):
+    assert admission.cost_of("solution", style) == admission.DEFAULT_COST
+
+
+def test_style_is_case_insensitive_and_ignored_for_fixed_cost_types():
+    assert admission.cost_of("solution", "Research") == admission.OUTPUT_TOKENS[("solution", "research")]
+    assert admission.cost_of("explanation", 5) == admission.OUTPUT_TOKENS[("explanation", None)]
+
+
+
+def wait_until(predicate, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def start_waiters(controller, specs, order):
+    """Queue one acquire() per (cost, batch) spec, in order; each records its cost once granted."""
+    threads = []
+    for cost, is_batch in specs:
+        def run(cost=cost, is_batch=is_batch):
+            ticket = controller.acquire(cost, batch=is_batch)
+            order.append(cost)
+            ticket.release()
+
+        queued = len(controller._waiters)
+        thread = threading.Thread(target=run)
+        thread.start()
+        wait_until(lambda: len(controller._waiters) == queued + 1)
+        threads.append(thread)
+    return threads
+
+
+def test_waiters_are_served_cheapest_first():
+    controller = admission.AdmissionController(budget=500, max_wait=2)
+    held = controller.acquire(500)
+    order = []
+    # Any two of these exceed the budget, so they are granted one at a time.
+    threads = start_waiters(controller, [(450, False), (300, False), (400, False)], order)
+    held.release()
+    for t in threads:
+        t.join()
+    assert order == [300, 400, 450]
+
+
+def test_batch_items_wait_behind_interactive_requests():
+    controller = admission.AdmissionController(budget=500, max_wait=2)
+    held = controller.acquire(500)
+    order = []
+    threads = start_waiters(controller, [(260, True), (450, False), (300, False)], order)
+    assert controller.stats()["queued"] == 2 and controller.stats()["queued_batch"] == 1
+    held.release()
+    for t in threads:
+        t.join()
+    assert order == [300, 450, 260]
+
+
+def test_full_queue_sheds_immediately():
+    controller = admission.AdmissionController(budget=100, queue_limit=1, max_wait=2)
+    held = controller.acquire(100)
+    threads = start_waiters(controller, [(100, False)], [])
+    start = time.monotonic()
+    with pytest.raises(admission.Rejected) as e:
+        controller.acquire(100)
+    assert time.monotonic() - start < 0.1
+    assert e.value.status == 503 and e.value.retry_after >= 1
+    assert controller.rejected_busy == 1
+    held.release()
+    for t in threads:
+        t.join()
+
+
+def test_batch_queue_limit_does_not_shed_interactive_requests():
+    controller = admission.AdmissionController(budget=100, queue_limit=1, batch_queue_limit=1, max_wait=2)
+    held = controller.acquire(100)
+    threads = start_waiters(controller, [(100, True)], [])
+    with pytest.raises(admission.Rejected):
+        controller.acquire(100, batch=True)
+    threads += start_waiters(controller, [(100, False)], [])
+    held.release()
+    for t in threads:
+        t.join()
+    assert controller.rejected_busy == 1
+
+
+def test_admit_refunds_the_client_when_shed_after_waiting():
+    controller = admission.AdmissionController(budget=100, max_wait=0.05, bucket_capacity=1000, bucket_refill=1)
+    held = controller.acquire(100)
+    with pytest.raises(admission.Rejected) as e:
+        controller.admit("client", 300)
+    assert e.value.status == 503
+    assert controller._buckets["client"].tokens == pytest.approx(1000, abs=1)
+    assert controller.stats()["queued"] == 0
+    held.release()
+
+
+def test_empty_bucket_is_429_with_retry_after():
+    controller = admission.AdmissionController(bucket_capacity=100, bucket_refill=10)
+    controller.charge("client", 100)
+    with pytest.raises(admission.Rejected) as e:
+        controller.charge("client", 50)
+    assert e.value.status == 429 and e.value.retry_after == 5
+    assert controller.rejected_client == 1
+    # Other clients have their own bucket.
+    controller.charge("other", 100)
+
+
+def test_allow_debt_charges_past_empty_only_once():
+    controller = admission.AdmissionController(bucket_capacity=100, bucket_refill=10)
+    controller.charge("client", 300, allow_debt=True)
+    assert controller._buckets["client"].tokens == pytest.approx(-200, abs=1)
+    with pytest.raises(admission.Rejected) as e:
+        controller.charge("client", 1, allow_debt=True)
+    assert e.value.status == 429 and e.value.retry_after >= 20
+
+
+def test_ticket_release_is_idempotent():
+    controller = admission.AdmissionController(budget=500)
+    ticket = controller.acquire(200)
+    ticket.release()
+    ticket.release()
+    stats = controller.stats()
+    assert (stats["in_flight"], stats["in_flight_cost"]) == (0, 0)
+    assert controller.acquire(500).cost == 500
@@ -0,0 +1,178 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+import admission
+import app as app_module
+import cache
+import history
+import identity
+import llm
+import stub_llm
+import transcripts
+from app import app
+from fakes import FakeCollection
+
+
+@pytest.fixture(scope="module")
+def upstream():
+    server = stub_llm.start(latency=0, tokens=5, rate=0)
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def client(upstream, monkeypatch):
+    monkeypatch.setattr(llm, "OPENAI_BASE_URL", upstream.base_url)
+    return app.test_client()
+
+
+@pytest.mark.parametrize("body", [
+    {"category": "gate", "topic": "Evaluate \\int_0^{1} x dx"},
+    {"category": "upsc", "topic": "{0} and {}", "style": "step"},
+    {"topic": "a {b} c", "style": "weird"},
+    {"topic": "a {b} c", "style": "research"},
+])
+def test_topics_with_braces_are_answered(client, body):
+    resp = client.post("/api/solve", json=body)
+    assert resp.status_code == 200
+    assert resp.get_json()["answer"]
+
+
+@pytest.mark.parametrize("mode, body", [
+    ("solve", {"topic": 5}),
+    ("solve", {"topic": ["x"]}),
+    ("solve", {"topic": "x", "style": 5}),
+    ("solve", {"topic": "x", "category": {"a": 1}}),
+    ("learn", {"topic": "x", "category": 1}),
+    ("summarize", {"topic": "x", "transcript": ["a"]}),
+    ("summarize", {"video": 123}),
+    ("solve", [1, 2]),
+    ("solve", "x"),
+    ("learn", 5),
+])
+def test_non_string_fields_are_rejected(client, mode, body):
+    resp = client.post(f"/api/{mode}", json=body)
+    assert resp.status_code == 400
+    assert "must be a" in resp.get_json()["error"]
+
+
+def test_batch_with_invalid_items_still_streams_results(client):
+    resp = client.post("/api/solve/batch", json={"items": [
+        {"topic": "batch ok"}, {"topic": "batch bad", "style": 5}, "not an item",
+    ]})
+    assert resp.status_code == 200
+    lines = sorted((json.loads(line) for line in resp.data.splitlines()), key=lambda r: r["index"])
+    assert [r["ok"] for r in lines] == [True, False, False]
+    assert lines[1]["error"] == "style must be a string"
+
+
+def test_batch_cost_uses_validated_items():
+    assert app_module.batch_cost({"topic": "x"}) == admission.cost_of("solution", "smart")
+    assert app_module.batch_cost({"topic": "x", "style": 5}) == admission.DEFAULT_COST
+    assert app_module.batch_cost(7) == admission.DEFAULT_COST
+
+
+def test_json_miss_looks_the_cache_up_once(client, monkeypatch):
+    rc = cache.ResponseCache(l1=cache.LRUCache(maxsize=8))
+    monkeypatch.setattr(app_module, "get_cache", lambda: rc)
+    assert client.post("/api/solve", json={"topic": "counted once"}).status_code == 200
+    assert rc.stats()["misses"] == 1
+    assert client.post("/api/solve", json={"topic": "counted once"}).status_code == 200
+    assert rc.stats()["hits_l1"] == 1
+
+
+def test_rate_limits_key_on_the_hop_added_by_the_proxy(client, monkeypatch):
+    controller = admission.AdmissionController()
+    monkeypatch.setattr(admission, "get_controller", lambda: controller)
+    client.post("/api/solve", json={"topic": "who is asking"}, headers={"X-Forwarded-For": "6.6.6.6, 203.0.113.7"})
+    assert list(controller._buckets) == ["203.0.113.7"]
+
+
+@pytest.fixture
+def history_db(monkeypatch):
+    coll = FakeCollection()
+    monkeypatch.setenv("MONGO_URI", "mongodb://127.0.0.1:1")
+    monkeypatch.setenv("USER_TOKEN_SECRET", "test-secret")
+    monkeypatch.setattr(history, "get_collection", lambda: coll)
+    return coll
+
+
+def new_token(client):
+    resp = client.post("/api/identity")
+    assert resp.status_code == 201
+    return resp.get_json()["token"]
+
+
+def test_history_pages_through_the_token_users_records(client, history_db):
+    token = new_token(client)
+    user = identity.verify(token)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for i in range(5):
+        history_db.docs[i] = {
+            "_id": ObjectId(), "user": user, "created_at": start + timedelta(seconds=i // 2),
+            "category": "gate", "type": "solution", "style": "smart", "topic": f"q{i}", "answer": "a",
+        }
+    history_db.docs["other"] = dict(history_db.docs[0], _id=ObjectId(), user="someone-else", topic="private")
+
+    topics, cursor = [], None
+    while True:
+        query = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = client.get("/api/history", query_string=query, headers={"X-User-Token": token})
+        assert resp.status_code == 200
+        body = resp.get_json()
+        assert len(body["items"]) <= 2
+        topics += [item["topic"] for item in body["items"]]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(topics) == ["q0", "q1", "q2", "q3", "q4"]
+    assert topics[0] == "q4" and topics[-1] in ("q0", "q1")
+
+
+@pytest.mark.parametrize("headers", [
+    {},
+    {"X-User-Id": "someone-else"},
+    {"X-User-Token": "someone-else.forged"},
+])
+def test_history_requires_a_valid_token(client, history_db, headers):
+    assert client.get("/api/history", headers=headers).status_code == 401
+
+
+def test_history_rejects_a_bad_cursor(client, history_db):
+    resp = client.get("/api/history?cursor=!!!", headers={"X-User-Token": new_token(client)})
+    assert resp.status_code == 400
+
+
+def test_history_and_tokens_are_disabled_without_a_secret(client, history_db, monkeypatch):
+    monkeypatch.delenv("USER_TOKEN_SECRET")
+    assert client.post("/api/identity").status_code == 503
+    assert client.get("/api/history").status_code == 503
+
+
+def test_answers_are_recorded_for_the_token_user_only(client, history_db, monkeypatch):
+    recorded = []
+    monkeypatch.setattr(history, "record", lambda user, *args: recorded.append(user))
+    token = new_token(client)
+    client.post("/api/solve", json={"topic": "whose history"}, headers={"X-User-Token": token})
+    client.post("/api/solve", json={"topic": "whose history"},
+                headers={"X-User-Id": "someone-else", "X-Forwarded-For": "203.0.113.7"})
+    assert recorded == [identity.verify(token), None]
+
+
+def test_video_summaries_are_billed_per_map_chunk(monkeypatch):
+    segs = [(i, i + 1, f"segment {i} " * 10) for i in range(500)]
+    monkeypatch.setattr(transcripts, "fetch_transcript", lambda video_id: segs)
+    args, video_id, _ = app_module.parse_query("summarize", {"video": "dQw4w9WgXcQ"})
+    chunks = transcripts.map_calls(segs)
+    assert chunks > 1
+    expected = admission.cost_of("summary") + chunks * admission.cost_of("summary_chunk")
+    assert app_module.query_cost(args, video_id) == expected
+    assert app_module.query_cost(dict(args, transcript="short text"), None) == admission.cost_of("summary")
+
+
+@pytest.mark.parametrize("body", [[1], "x", {"items": []}, {"items": {"topic": "x"}}])
+def test_malformed_batches_are_rejected(client, body):
+    assert client.post("/api/solve/batch", json=body).status_code == 400
@@ -0,0 +1,75 @@
+import threading
+import time
+
+import batch
+
+
+def test_at_most_concurrency_items_are_in_flight():
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def solve(item):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.01)
+        with lock:
+            state["running"] -= 1
+        return item
+
+    results = list(batch.run_batch(range(20), solve, concurrency=3))
+    assert sorted(r["answer"] for r in results) == list(range(20))
+    assert state["peak"] == 3
+
+
+def test_results_arrive_in_completion_order_with_their_index():
+    delays = [0.15, 0.0, 0.08]
+
+    def solve(item):
+        time.sleep(delays[item])
+        return f"answer {item}"
+
+    results = list(batch.run_batch([0, 1, 2], solve, concurrency=3))
+    assert [r["index"] for r in results] == [1, 2, 0]
+    assert all(r["ok"] and r["answer"] == f"answer {r['index']}" for r in results)
+
+
+def test_a_failing_item_does_not_stop_the_batch():
+    def solve(item):
+        if item == 2:
+            raise ValueError("bad item")
+        if item == 3:
+            raise RuntimeError()
+        return item
+
+    results = {r["index"]: r for r in batch.run_batch(range(6), solve, concurrency=2)}
+    assert sorted(results) == list(range(6))
+    assert results[2] == {"index": 2, "ok": False, "error": "bad item"}
+    assert results[3] == {"index": 3, "ok": False, "error": "RuntimeError"}
+    assert all(results[i]["ok"] for i in (0, 1, 4, 5))
+
+
+def test_closing_the_generator_cancels_items_not_started():
+    started = []
+    release = threading.Event()
+
+    def solve(item):
+        started.append(item)
+        if item > 0:
+            release.wait(1)
+        return item
+
+    results = batch.run_batch(range(50), solve, concurrency=2)
+    assert next(results)["index"] == 0
+    results.close()
+    release.set()
+    time.sleep(0.05)
+    # Item 0 finished, 1 was running and 2 refilled its slot; nothing else ever starts.
+    assert sorted(started) == [0, 1, 2]
+
+
+def test_clamp_concurrency():
+    assert batch.clamp_concurrency(None) == batch.BATCH_CONCURRENCY
+    assert batch.clamp_concurrency("x") == batch.BATCH_CONCURRENCY
+    assert batch.clamp_concurrency(0) == 1
+    assert batch.clamp_concurrency(10**6) == batch.BATCH_MAX_CONCURRENCY
@@ -0,0 +1,118 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import cache
+from fakes import BrokenCollection, FakeCollection
+
+
+def test_lru_evicts_least_recently_used():
+    lru = cache.LRUCache(maxsize=2, ttl=60)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1
+    lru.set("c", 3)
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.evictions == 1
+
+
+def test_lru_entries_expire_after_ttl():
+    lru = cache.LRUCache(maxsize=4, ttl=0.05)
+    lru.set("a", 1)
+    lru.set("b", 2, ttl=60)
+    time.sleep(0.06)
+    assert lru.get("a") is None
+    assert lru.get("b") == 2
+
+
+def test_make_key_normalizes_whitespace_style_case_and_unused_style():
+    key = cache.make_key("Generic", "solution", "Smart", "  Ohm's   Law ")
+    assert key == cache.make_key("generic", "solution", "smart", "Ohm's Law")
+    assert key != cache.make_key("generic", "solution", "step", "Ohm's Law")
+    # Explanations ignore category and style, exactly like get_prompt.
+    assert cache.make_key("gate", "explanation", None, "x") == cache.make_key("generic", "explanation", "step", "x")
+
+
+def test_make_key_keeps_topic_case():
+    milli = cache.make_key("gate", "solution", "smart", "Current through a 10 mA source")
+    assert milli != cache.make_key("gate", "solution", "smart", "Current through a 10 MA source")
+    assert cache.make_key("gate", "solution", "smart", "find v") != cache.make_key("gate", "solution", "smart", "find V")
+
+
+def test_make_key_includes_transcript_hash_for_summaries():
+    a = cache.make_key("generic", "summary", "smart", "Lecture", transcript="one")
+    b = cache.make_key("generic", "summary", "smart", "Lecture", transcript="two")
+    assert a != b
+
+
+def test_mongo_cache_get_set_and_expiry():
+    coll = FakeCollection()
+    l2 = cache.MongoCache(coll, ttl=60)
+    assert l2.get("k") is None
+    l2.set("k", "answer")
+    assert l2.get("k") == "answer"
+    # The TTL monitor runs lazily, so an expired document that is still present is a miss.
+    coll.docs["k"]["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+    assert l2.get("k") is None
+
+
+def test_mongo_cache_does_not_build_indexes_on_the_request_path():
+    coll = FakeCollection()
+    l2 = cache.MongoCache(coll)
+    l2.set("k", "v")
+    l2.get("k")
+    assert coll.indexes == []
+    l2.ensure_indexes()
+    l2.ensure_indexes()
+    assert len(coll.indexes) == 2
+
+
+def test_mongo_cache_trims_oldest_documents_beyond_max_docs():
+    coll = FakeCollection()
+    l2 = cache.MongoCache(coll, max_docs=3, trim_every=5)
+    for i in range(5):
+        l2.set(f"k{i}", i)
+        time.sleep(0.001)
+    assert sorted(coll.docs) == ["k2", "k3", "k4"]
+    assert l2.evictions == 2
+
+
+def test_response_cache_counts_hits_and_misses_and_promotes_l2_hits():
+    l2 = cache.MongoCache(FakeCollection())
+    rc = cache.ResponseCache(l1=cache.LRUCache(maxsize=8), l2=l2)
+    assert rc.get("k") is None
+    l2.set("k", "v")
+    assert rc.get("k") == "v"
+    assert rc.get("k") == "v"
+    stats = rc.stats()
+    assert (stats["misses"], stats["hits_l2"], stats["hits_l1"]) == (1, 1, 1)
+
+
+def test_response_cache_get_or_compute_stores_result():
+    rc = cache.ResponseCache(l1=cache.LRUCache(maxsize=8))
+    calls = []
+    assert rc.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert rc.get_or_compute("k", lambda: calls.append(1) or "v") == "v"
+    assert len(calls) == 1
+
+
+def test_l2_errors_are_misses_and_open_the_circuit():
+    broken = BrokenCollection()
+    rc = cache.ResponseCache(l1=cache.LRUCache(maxsize=8), l2=cache.MongoCache(broken), l2_backoff=60)
+    assert rc.get("k") is None
+    rc.set("k2", "v")
+    assert rc.get("k3") is None
+    # Only the first call reached Mongo; the rest were skipped while the circuit was open.
+    assert broken.calls == 1
+    stats = rc.stats()
+    assert stats["errors"] == 1 and stats["l2_skipped"] == 2 and stats["misses"] == 2
+    assert rc.get("k2") == "v"
+
+
+def test_l2_is_retried_after_backoff():
+    broken = BrokenCollection()
+    rc = cache.ResponseCache(l1=cache.LRUCache(maxsize=8), l2=cache.MongoCache(broken), l2_backoff=0.01)
+    rc.get("a")
+    time.sleep(0.02)
+    rc.get("b")
+    assert broken.calls == 2
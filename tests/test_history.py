@@ -0,0 +1,157 @@
+import base64
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+from bson.errors import InvalidDocument
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import history
+from fakes import FakeCollection
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def add(coll, user, created_at, **extra):
+    doc = {"_id": ObjectId(), "user": user, "created_at": created_at, **extra}
+    coll.docs[doc["_id"]] = doc
+    return doc
+
+
+def walk(coll, user, limit):
+    pages, cursor = [], None
+    while True:
+        docs, cursor = history.page(coll, user, limit, cursor)
+        pages.append(docs)
+        if cursor is None:
+            return pages
+
+
+def test_page_walks_newest_first_through_tied_timestamps():
+    coll = FakeCollection()
+    # Five records share one millisecond; keyset order falls back to _id.
+    docs = [add(coll, "u", T0) for _ in range(5)]
+    docs += [add(coll, "u", T0 + timedelta(seconds=i)) for i in (1, 2)]
+    docs.append(add(coll, "u", T0 - timedelta(seconds=1)))
+    add(coll, "someone else", T0)
+
+    pages = walk(coll, "u", 2)
+    seen = [d["_id"] for page in pages for d in page]
+    expected = [d["_id"] for d in sorted(docs, key=lambda d: (d["created_at"], d["_id"]), reverse=True)]
+    assert seen == expected
+    assert [len(p) for p in pages] == [2, 2, 2, 2]
+
+
+def test_last_page_has_no_cursor():
+    coll = FakeCollection()
+    for i in range(3):
+        add(coll, "u", T0 + timedelta(seconds=i))
+    docs, cursor = history.page(coll, "u", 3)
+    assert len(docs) == 3 and cursor is None
+    docs, cursor = history.page(coll, "u", 2)
+    assert len(docs) == 2 and cursor is not None
+    docs, cursor = history.page(coll, "u", 2, cursor)
+    assert len(docs) == 1 and cursor is None
+    assert history.page(coll, "nobody", 2) == ([], None)
+
+
+def test_cursor_round_trips_to_the_millisecond():
+    doc = {"_id": ObjectId(), "created_at": T0 + timedelta(milliseconds=1234)}
+    assert history.decode_cursor(history.encode_cursor(doc)) == (doc["created_at"], doc["_id"])
+
+
+@pytest.mark.parametrize("cursor", [
+    "!!!",
+    "abc",
+    base64.urlsafe_b64encode(b'{"t": 1}').decode(),
+    base64.urlsafe_b64encode(b'{"t": "x", "id": "0123456789ab0123456789ab"}').decode(),
+    base64.urlsafe_b64encode(b'{"t": 1, "id": "not-an-object-id"}').decode(),
+])
+def test_malformed_cursor_raises_cursor_error(cursor):
+    with pytest.raises(history.CursorError):
+        history.page(FakeCollection(), "u", 2, cursor)
+
+
+class FailingCollection(FakeCollection):
+    def __init__(self, error):
+        super().__init__()
+        self.error = error
+
+    def insert_many(self, docs, ordered=True):
+        raise self.error
+
+
+def writer(coll, **kwargs):
+    # A long interval keeps the background thread out of the way; tests flush explicitly.
+    return history.HistoryWriter(lambda: coll, **{"batch_size": 100, "interval": 60, **kwargs})
+
+
+def test_flush_writes_batches_and_builds_indexes_once():
+    coll = FakeCollection()
+    w = writer(coll, batch_size=2)
+    for i in range(5):
+        w.record({"user": "u", "topic": str(i)})
+    assert w.flush() == 5
+    assert len(coll.docs) == 5 and w.pending() == 0
+    w.record({"user": "u"})
+    w.flush()
+    assert len(coll.indexes) == 2
+
+
+def test_unreachable_database_puts_the_batch_back():
+    w = writer(FailingCollection(AutoReconnect("down")))
+    for i in range(3):
+        w.record({"user": "u", "topic": str(i)})
+    assert w.flush() == 0
+    assert w.pending() == 3 and w.stats()["errors"] == 1 and w.dropped == 0
+    assert [d["topic"] for d in w._buffer] == ["0", "1", "2"]
+
+
+def test_bulk_write_error_counts_duplicates_as_written_and_drops_the_rest():
+    error = BulkWriteError({"writeErrors": [{"index": 0, "code": 11000}, {"index": 1, "code": 121}]})
+    w = writer(FailingCollection(error))
+    for i in range(4):
+        w.record({"user": "u"})
+    assert w.flush() == 3
+    assert (w.written, w.dropped, w.errors, w.pending()) == (3, 1, 1, 0)
+
+
+def test_invalid_documents_are_dropped_not_retried():
+    w = writer(FailingCollection(InvalidDocument("cannot encode")))
+    w.record({"user": "u"})
+    w.record({"user": "u"})
+    assert w.flush() == 0
+    assert (w.dropped, w.errors, w.pending()) == (2, 1, 0)
+
+
+def test_full_buffer_drops_the_oldest_records():
+    w = writer(FakeCollection(), max_buffer=3)
+    for i in range(5):
+        w.record({"user": "u", "topic": str(i)})
+    assert w.dropped == 2 and w.pending() == 3
+    assert [d["topic"] for d in w._buffer] == ["2", "3", "4"]
+
+
+def test_writer_thread_survives_unexpected_errors():
+    calls = []
+
+    def get_collection():
+        calls.append(1)
+        raise RuntimeError("MONGO_URI is not configured")
+
+    w = history.HistoryWriter(get_collection, batch_size=1, interval=0.01)
+    w.record({"user": "u"})
+    deadline = time.monotonic() + 2
+    while len(calls) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert w._thread.is_alive()
+    assert w.errors >= 1 and w.dropped >= 1
+    # Later records are still flushed by the same thread.
+    coll = FakeCollection()
+    w.get_collection = lambda: coll
+    w.record({"user": "u", "topic": "after"})
+    deadline = time.monotonic() + 2
+    while not coll.docs and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [d["topic"] for d in coll.docs.values()] == ["after"]
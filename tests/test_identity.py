@@ -0,0 +1,41 @@
+import pytest
+
+import identity
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setenv("USER_TOKEN_SECRET", "test-secret")
+
+
+def test_issued_tokens_verify_to_distinct_users():
+    a, b = identity.issue(), identity.issue()
+    assert identity.verify(a) and identity.verify(b)
+    assert identity.verify(a) != identity.verify(b)
+    assert identity.verify(a) == a.rpartition(".")[0]
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda t: t.rpartition(".")[0],
+    lambda t: "someone-else." + t.rpartition(".")[2],
+    lambda t: t[:-1] + ("A" if t[-1] != "A" else "B"),
+    lambda t: "",
+    lambda t: "é." + t.rpartition(".")[2],
+])
+def test_forged_or_tampered_tokens_are_rejected(mangle):
+    assert identity.verify(mangle(identity.issue())) is None
+
+
+def test_tokens_from_another_secret_are_rejected(monkeypatch):
+    token = identity.issue()
+    monkeypatch.setenv("USER_TOKEN_SECRET", "rotated")
+    assert identity.verify(token) is None
+
+
+def test_no_secret_disables_tokens(monkeypatch):
+    token = identity.issue()
+    monkeypatch.delenv("USER_TOKEN_SECRET")
+    assert not identity.enabled()
+    assert identity.verify(token) is None
+    with pytest.raises(RuntimeError):
+        identity.issue()
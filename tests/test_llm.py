@@ -0,0 +1,95 @@
+import socket
+import threading
+
+import pytest
+
+import llm
+import stub_llm
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    servers = []
+
+    def start(**kwargs):
+        server = stub_llm.start(**{"latency": 0, "tokens": 5, "rate": 0, **kwargs})
+        servers.append(server)
+        monkeypatch.setattr(llm, "OPENAI_BASE_URL", server.base_url)
+        return server
+
+    # Each test gets a fresh session so pool settings patched below take effect.
+    monkeypatch.setattr(llm, "_session", None)
+    monkeypatch.setattr(llm, "BACKOFF_BASE", 0)
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def run_concurrently(fn, args):
+    barrier = threading.Barrier(len(args))
+    results = [None] * len(args)
+
+    def call(i):
+        barrier.wait()
+        try:
+            results[i] = fn(args[i])
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(args))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def test_concurrent_duplicates_make_one_upstream_call(upstream):
+    server = upstream(latency=0.3)
+    results = run_concurrently(llm.complete, ["same prompt"] * 8)
+    assert server.hits == 1
+    assert len(set(results)) == 1 and isinstance(results[0], str)
+
+
+def test_connections_stay_within_pool_size(upstream, monkeypatch):
+    monkeypatch.setattr(llm, "POOL_SIZE", 3)
+    server = upstream(latency=0.1)
+    results = run_concurrently(llm.complete, [f"prompt {i}" for i in range(12)])
+    assert all(isinstance(r, str) for r in results)
+    assert server.hits == 12
+    assert server.connections <= 3
+
+
+def test_full_pool_fails_after_pool_timeout(upstream, monkeypatch):
+    monkeypatch.setattr(llm, "POOL_SIZE", 1)
+    monkeypatch.setattr(llm, "POOL_TIMEOUT", 0.1)
+    upstream(latency=0.5)
+    results = run_concurrently(llm.complete, ["a", "b"])
+    errors = [r for r in results if isinstance(r, llm.LLMError)]
+    assert len(errors) == 1 and "no free upstream connection" in str(errors[0])
+
+
+def test_503_then_200_succeeds_after_retry(upstream):
+    server = upstream(fail_first=1)
+    assert llm.complete("retry me")
+    assert (server.hits, server.errors) == (2, 1)
+
+
+def test_read_timeout_is_not_retried(upstream, monkeypatch):
+    monkeypatch.setattr(llm, "READ_TIMEOUT", 0.1)
+    server = upstream(latency=0.5)
+    with pytest.raises(llm.LLMError):
+        llm.complete("slow")
+    assert server.hits == 1
+
+
+def test_connection_refused_is_retried(upstream, monkeypatch):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    monkeypatch.setattr(llm, "OPENAI_BASE_URL", f"http://127.0.0.1:{port}/v1")
+    attempts = []
+    monkeypatch.setattr(llm, "backoff_delay", lambda attempt, retry_after=None: attempts.append(attempt) or 0)
+    with pytest.raises(llm.LLMError):
+        llm.complete("nobody home")
+    assert attempts == list(range(llm.MAX_RETRIES))
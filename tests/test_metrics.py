@@ -0,0 +1,108 @@
+import os
+import threading
+import time
+
+import pytest
+
+import llm
+import metrics
+import stub_llm
+from app import app
+
+
+def test_histogram_renders_cumulative_buckets_sum_and_count():
+    h = metrics.Histogram("t_seconds", "Test.", ("route",), buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 2):
+        h.observe(value, "/a")
+    lines = h.render("7")
+    assert lines[:2] == ["# HELP t_seconds Test.", "# TYPE t_seconds histogram"]
+    assert lines[2:] == [
+        't_seconds_bucket{route="/a",worker="7",le="0.1"} 2',  # le is inclusive: 0.1 lands in it
+        't_seconds_bucket{route="/a",worker="7",le="1"} 3',
+        't_seconds_bucket{route="/a",worker="7",le="+Inf"} 4',
+        't_seconds_sum{route="/a",worker="7"} 2.650000',
+        't_seconds_count{route="/a",worker="7"} 4',
+    ]
+
+
+def test_histogram_series_are_kept_per_label_set():
+    h = metrics.Histogram("t", "Test.", ("route",), buckets=(1,))
+    h.observe(0.5, "/b")
+    h.observe(5, "/a")
+    counts = [line for line in h.render("1") if line.startswith("t_count")]
+    assert counts == ['t_count{route="/a",worker="1"} 1', 't_count{route="/b",worker="1"} 1']
+
+
+def test_counter_escapes_label_values():
+    c = metrics.Counter("t_total", "Test.", ("kind",))
+    c.inc('a"b\\c\nd')
+    c.inc('a"b\\c\nd', amount=2)
+    assert c.render("1")[-1] == 't_total{kind="a\\"b\\\\c\\nd",worker="1"} 3'
+
+
+def test_gauge_callback_errors_render_no_samples():
+    def broken():
+        raise RuntimeError("scrape-time failure")
+
+    assert metrics.Gauge("g", "Test.", (), broken).render("1") == ["# HELP g Test.", "# TYPE g gauge"]
+
+
+def test_in_flight_returns_to_zero_after_the_response_closes():
+    client = app.test_client()
+    # Other tests may leave test-client responses unclosed; compare against where we started.
+    before = metrics._in_flight[0]
+    resp = client.get("/")
+    assert resp.status_code == 200
+    # The WSGI server closes the response; the test client leaves that to the caller.
+    resp.close()
+    assert metrics._in_flight[0] == before
+    with client.get("/metrics") as scrape:
+        text = scrape.get_data(as_text=True)
+    assert 'vikal_request_duration_seconds_count{route="/",status="200",worker="%d"}' % os.getpid() in text
+
+
+def test_in_flight_counts_open_streams_until_closed(monkeypatch):
+    server = stub_llm.start(latency=0, tokens=20, rate=100)
+    monkeypatch.setattr(llm, "OPENAI_BASE_URL", server.base_url)
+    before = metrics._in_flight[0]
+    try:
+        resp = app.test_client().post("/api/learn?stream=1", json={"topic": "in flight stream"}, buffered=False)
+        chunks = iter(resp.response)
+        next(chunks)
+        assert metrics._in_flight[0] == before + 1
+        assert b"event: done" in b"".join(chunks)
+        resp.close()
+        assert metrics._in_flight[0] == before
+    finally:
+        server.shutdown()
+
+
+def slow_handler(seconds):
+    time.sleep(seconds)
+
+
+@pytest.mark.parametrize("elapsed, written", [(0.2, True), (0.001, False)])
+def test_profiler_writes_folded_stacks_only_for_slow_requests(tmp_path, elapsed, written):
+    profiler = metrics.SamplingProfiler(slow_ms=50, out_dir=str(tmp_path), interval=0.001)
+    result = {}
+
+    def request():
+        ident = threading.get_ident()
+        profiler.start(ident)
+        slow_handler(0.05)
+        profiler.finish(ident, "/api/<mode>", elapsed)
+        result["ident"] = ident
+
+    thread = threading.Thread(target=request)
+    thread.start()
+    thread.join()
+    path = tmp_path / f"profile-{os.getpid()}.folded"
+    if not written:
+        assert not path.exists()
+        return
+    lines = path.read_text().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert stack.startswith("/api/<mode>;") and int(count) > 0
+    assert any("slow_handler (test_metrics.py:" in line for line in lines)
@@ -0,0 +1,153 @@
+import re
+import threading
+import time
+
+import pytest
+
+import transcripts
+
+VIDEO = "dQw4w9WgXcQ"
+
+
+@pytest.mark.parametrize("value", [
+    VIDEO,
+    f" {VIDEO} ",
+    f"https://www.youtube.com/watch?v={VIDEO}&t=42s",
+    f"https://youtu.be/{VIDEO}?si=abc",
+    f"https://www.youtube.com/shorts/{VIDEO}",
+    f"https://www.youtube.com/embed/{VIDEO}",
+])
+def test_video_id_from_accepts_ids_and_urls(value):
+    assert transcripts.video_id_from(value) == VIDEO
+
+
+@pytest.mark.parametrize("value", ["", "short", "https://example.com/watch?x=1", VIDEO + "x!"])
+def test_video_id_from_rejects_everything_else(value):
+    with pytest.raises(transcripts.TranscriptError):
+        transcripts.video_id_from(value)
+
+
+def segments(n, chars=40, length=5.0):
+    return [(i * length, (i + 1) * length, f"s{i:02d}".ljust(chars, "x")) for i in range(n)]
+
+
+def test_iter_chunks_respects_the_token_bound_and_keeps_timestamps():
+    segs = segments(10)  # 11 tokens each, with the separator
+    chunks = list(transcripts.iter_chunks(segs, max_tokens=30))
+    assert len(chunks) == 5
+    for i, (start, end, text) in enumerate(chunks):
+        assert transcripts.estimate_tokens(text) <= 30
+        assert (start, end) == (segs[2 * i][0], segs[2 * i + 1][1])
+        assert text == " ".join(s[2] for s in segs[2 * i:2 * i + 2])
+
+
+def test_iter_chunks_never_splits_a_segment():
+    segs = [(0, 1, "a" * 40), (1, 2, "b" * 400), (2, 3, "c" * 40)]
+    chunks = list(transcripts.iter_chunks(segs, max_tokens=30))
+    assert [c[2] for c in chunks] == ["a" * 40, "b" * 400, "c" * 40]
+    assert [(c[0], c[1]) for c in chunks] == [(0, 1), (1, 2), (2, 3)]
+
+
+def chunk_index(prompt):
+    return int(re.search(r"chunk-(\d+)", prompt).group(1))
+
+
+def test_map_chunks_keeps_transcript_order_and_bounds_pending_chunks():
+    workers = 2
+    state = {"pulled": 0, "done": 0, "max_pending": 0}
+    lock = threading.Lock()
+
+    def chunks():
+        for i in range(12):
+            with lock:
+                state["pulled"] += 1
+                state["max_pending"] = max(state["max_pending"], state["pulled"] - state["done"])
+            yield i * 10, i * 10 + 10, f"chunk-{i}"
+
+    def complete(prompt):
+        index = chunk_index(prompt)
+        # Later chunks finish first, so completion order differs from transcript order.
+        time.sleep(0.002 * (12 - index))
+        with lock:
+            state["done"] += 1
+        return f"notes {index}"
+
+    notes = transcripts.map_chunks(chunks(), "Topic", complete, workers=workers)
+    assert notes == [(i * 10, i * 10 + 10, f"notes {i}") for i in range(12)]
+    assert state["max_pending"] <= 2 * workers
+
+
+def test_map_chunks_cancels_queued_chunks_after_a_failure():
+    workers = 4
+    pulled = []
+    started = []
+
+    def chunks():
+        for i in range(20):
+            pulled.append(i)
+            yield i, i + 1, f"chunk-{i}"
+
+    def complete(prompt):
+        index = chunk_index(prompt)
+        started.append(index)
+        if index == 0:
+            # Fail once the pending window (2 * workers) is full.
+            while len(pulled) < 2 * workers:
+                time.sleep(0.001)
+            time.sleep(0.02)
+            raise transcripts.TranscriptError("upstream failed")
+        time.sleep(0.2)
+        return "notes"
+
+    with pytest.raises(transcripts.TranscriptError):
+        transcripts.map_chunks(chunks(), "Topic", complete, workers=workers)
+    # Chunks 0-3 were running; at most one queued chunk may start before the cancel lands.
+    assert len(started) <= workers + 1
+    assert len(pulled) == 2 * workers
+
+
+def test_reduce_notes_remaps_until_the_notes_fit(monkeypatch):
+    monkeypatch.setattr(transcripts, "DIRECT_TOKENS", 100)
+    calls = []
+
+    def complete(prompt):
+        calls.append(prompt)
+        return "reduced-notes"
+
+    notes = [(i * 60, i * 60 + 60, "n" * 40) for i in range(10)]  # 110 tokens: over the limit
+    prompt = transcripts.reduce_notes(notes, "Topic", complete=complete, workers=2)
+    # Re-chunked at DIRECT_TOKENS // 2 = 50 tokens: 4 + 4 + 2 notes.
+    assert len(calls) == 3
+    assert prompt.count("reduced-notes") == 3
+    assert "[0:00-4:00]" in prompt and "[8:00-10:00]" in prompt
+
+
+def test_reduce_notes_stops_when_remapping_does_not_shrink(monkeypatch):
+    monkeypatch.setattr(transcripts, "DIRECT_TOKENS", 100)
+    notes = [(i, i + 1, "n" * 400) for i in range(3)]
+    prompt = transcripts.reduce_notes(notes, "Topic", complete=lambda prompt: "n" * 400, workers=2)
+    assert prompt.count("n" * 400) == 3
+
+
+def test_short_transcripts_skip_the_map_step():
+    def complete(prompt):
+        raise AssertionError("map step should not run")
+
+    segs = segments(3)
+    prompt = transcripts.summary_prompt(segs, "Topic", complete=complete)
+    assert all(text in prompt for _, _, text in segs)
+    assert transcripts.map_calls(segs) == 0
+
+
+def test_long_transcripts_map_every_chunk(monkeypatch):
+    monkeypatch.setattr(transcripts, "DIRECT_TOKENS", 100)
+    calls = []
+    segs = [(i, i + 1, f"segment {i} " * 10) for i in range(200)]
+
+    def complete(prompt):
+        calls.append(prompt)
+        return "notes"
+
+    prompt = transcripts.summary_prompt(segs, "Topic", complete=complete, workers=2)
+    assert len(calls) == transcripts.map_calls(segs) == len(list(transcripts.iter_chunks(segs)))
+    assert "notes" in prompt and "segment 0" not in prompt
@@ -0,0 +1,158 @@
+# transcripts.py
+"""
+Map-reduce summarization for long YouTube transcripts.
+- Transcripts are fetched once per video ID and kept in a per-worker LRU.
+- Segments are grouped into token-bounded chunks that keep their start/end timestamps.
+- Chunks are summarized concurrently on a bounded thread pool (map), and the partial notes
+  are folded into the standard Summary/Analogy/Notes/Keywords/Exam Tips prompt (reduce).
+- map_calls() counts the map step's upstream calls so admission can bill a video up front.
+Short transcripts skip the map step and use PROMPTS["generic"]["summary"] directly.
+"""
+
+import os
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import llm
+from cache import LRUCache
+from prompts import CHUNK_SUMMARY, get_prompt
+
+CHUNK_TOKENS = int(os.getenv("TRANSCRIPT_CHUNK_TOKENS", 2000))
+DIRECT_TOKENS = int(os.getenv("TRANSCRIPT_DIRECT_TOKENS", 6000))
+MAP_WORKERS = int(os.getenv("TRANSCRIPT_MAP_WORKERS", 4))
+
+_VIDEO_ID = re.compile(r"(?:v=|youtu\.be/|shorts/|embed/)([A-Za-z0-9_-]{11})")
+_transcripts = LRUCache(maxsize=int(os.getenv("TRANSCRIPT_CACHE_SIZE", 64)), ttl=24 * 3600)
+
+
+class TranscriptError(Exception):
+    """Raised when a transcript cannot be fetched for a video."""
+
+
+def video_id_from(value):
+    """Accept a bare 11-character video ID or any common YouTube URL form."""
+    value = (value or "").strip()
+    match = _VIDEO_ID.search(value)
+    if match:
+        return match.group(1)
+    if re.fullmatch(r"[A-Za-z0-9_-]{11}", value):
+        return value
+    raise TranscriptError(f"not a YouTube video: {value!r}")
+
+
+def estimate_tokens(text):
+    # Same ~4 chars/token heuristic as PromptTemplate.token_estimate.
+    return (len(text) + 3) // 4
+
+
+def fetch_transcript(video_id):
+    """Return the transcript as a list of (start, end, text) segments, cached by video ID."""
+    segments = _transcripts.get(video_id)
+    if segments is not None:
+        return segments
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    try:
+        raw = YouTubeTranscriptApi.get_transcript(video_id)
+    except Exception as e:
+        raise TranscriptError(f"could not fetch transcript for {video_id}: {e}") from e
+    # Keep only what the pipeline needs; the raw dicts carry extra keys per segment.
+    segments = [(s["start"], s["start"] + s.get("duration", 0), s["text"]) for s in raw]
+    _transcripts.set(video_id, segments)
+    return segments
+
+
+def _timestamp(seconds):
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60}:{seconds % 60:02d}"
+
+
+def iter_chunks(segments, max_tokens=CHUNK_TOKENS):
+    """
+    Lazily group (start, end, text) segments into chunks of at most ~max_tokens.
+    Yields (start, end, text); a segment is never split, so chunk edges fall on timestamps.
+    """
+    parts, tokens, start, end = [], 0, None, None
+    for seg_start, seg_end, text in segments:
+        cost = estimate_tokens(text) + 1
+        if parts and tokens + cost > max_tokens:
+            yield start, end, " ".join(parts)
+            parts, tokens = [], 0
+        if not parts:
+            start = seg_start
+        parts.append(text)
+        tokens += cost
+        end = seg_end
+    if parts:
+        yield start, end, " ".join(parts)
+
+
+def map_calls(segments):
+    """Upstream calls the map step will make for a transcript: 0 if it is summarized directly."""
+    if _direct(segments):
+        return 0
+    return sum(1 for _ in iter_chunks(segments))
+
+
+def _direct(segments):
+    total = 0
+    for _, _, text in segments:
+        total += estimate_tokens(text) + 1
+        if total > DIRECT_TOKENS:
+            return False
+    return True
+
+
+def map_chunks(chunks, topic, complete=None, workers=MAP_WORKERS):
+    """
+    Summarize (start, end, text) chunks concurrently; returns (start, end, notes) in transcript order.
+    At most 2 * workers chunks are pulled from the iterator at a time, so memory stays
+    bounded by the pool size rather than the transcript length.
+    """
+    complete = complete or llm.complete
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="transcript-map") as pool:
+        pending = {}
+
+        def collect(futures):
+            for f in futures:
+                index, start, end = pending.pop(f)
+                results[index] = (start, end, f.result())
+
+        try:
+            for index, (start, end, text) in enumerate(chunks):
+                prompt = CHUNK_SUMMARY.render(start=_timestamp(start), end=_timestamp(end), topic=topic, transcript=text)
+                pending[pool.submit(complete, prompt)] = (index, start, end)
+                if len(pending) >= 2 * workers:
+                    collect(wait(pending, return_when=FIRST_COMPLETED).done)
+            collect(list(pending))
+        except BaseException:
+            # The summary has failed; don't pay upstream for the chunks still queued.
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+    return [results[i] for i in range(len(results))]
+
+
+def reduce_notes(notes, topic, style="smart", complete=None, workers=MAP_WORKERS):
+    """
+    Build the final summary prompt from (start, end, notes) partials. If the notes themselves
+    are too long for one prompt, they are re-chunked and mapped again until they fit.
+    """
+    while len(notes) > 1 and sum(estimate_tokens(n) + 1 for _, _, n in notes) > DIRECT_TOKENS:
+        reduced = map_chunks(iter_chunks(notes, DIRECT_TOKENS // 2), topic, complete, workers)
+        if len(reduced) >= len(notes):
+            break
+        notes = reduced
+    text = "\n\n".join(f"[{_timestamp(start)}-{_timestamp(end)}]\n{n}" for start, end, n in notes)
+    return get_prompt("generic", "summary", style, topic, transcript=text)
+
+
+def summary_prompt(segments, topic, style="smart", complete=None, workers=MAP_WORKERS):
+    """Return the prompt for the final summary call, running the map step first if the transcript is long."""
+    if _direct(segments):
+        transcript = " ".join(text for _, _, text in segments)
+        return get_prompt("generic", "summary", style, topic, transcript=transcript)
+    notes = map_chunks(iter_chunks(segments), topic, complete, workers)
+    return reduce_notes(notes, topic, style, complete, workers=workers)